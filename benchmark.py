@@ -0,0 +1,275 @@
+"""
+Benchmarks for the MinMax search.
+
+Runs the search over a fixed set of positions and prints node counts,
+timings and transposition table statistics.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import chess
+import numpy as np
+from minmax import MinMax, is_mate, mate_plies
+from create_data import get_bit_map
+from encoding import encode_board, encode_boards
+from neural_eval import BatchEvaluator
+from numpy_mlp import NumpyMLP, save_weights
+from data_loader import DataLoader
+from dataset import DatasetWriter
+
+positions = [
+    chess.STARTING_FEN,
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4",
+    "r3k2r/pp1n1ppp/2p1pn2/q7/1bPP4/2N1PN2/PP1B1PPP/R2QKB1R w KQkq - 3 9",
+]
+
+def run_search(mm, fen, depth):
+    board = chess.Board(fen)
+    start = time.time()
+    move = mm.run_minmax(depth, board, board.turn == chess.WHITE)
+    return move, time.time() - start
+
+def bench_transposition(depth=4, tt_size_mb=16):
+
+    print(f"Transposition table (depth {depth}, {tt_size_mb} MB)")
+    total_plain = 0
+    total_tt = 0
+    for fen in positions:
+        plain = MinMax(tt_size_mb=0)
+        _, plain_time = run_search(plain, fen, depth)
+        hashed = MinMax(tt_size_mb=tt_size_mb)
+        _, tt_time = run_search(hashed, fen, depth)
+        s = hashed.stats()
+        total_plain += plain.nodes
+        total_tt += hashed.nodes
+        print(fen)
+        print(f"  no TT: {plain.nodes} nodes in {plain_time:.2f}s")
+        print(f"  TT:    {hashed.nodes} nodes in {tt_time:.2f}s, hit rate {s['tt']['hit_rate']:.1%}, {s['tt']['used']}/{s['tt']['capacity']} slots used")
+    print(f"Node reduction: {1 - total_tt/total_plain:.1%}")
+
+def bench_move_ordering(depth=4):
+
+    print(f"Move ordering (depth {depth})")
+    for fen in positions:
+        print(fen)
+        for ordering in (False, True):
+            mm = MinMax(move_ordering=ordering)
+            run_search(mm, fen, depth)
+            s = mm.stats()
+            label = "ordered:  " if ordering else "unordered:"
+            print(f"  {label} {s['nodes']} nodes in {s['time']:.2f}s ({s['nps']:.0f} nodes/s), first-move cutoffs {s['first_move_cutoff_rate']:.1%}")
+
+def bench_quiescence(depth=3):
+
+    print(f"Quiescence search (depth {depth})")
+    for fen in positions:
+        print(fen)
+        for q_depth in (0, 8):
+            mm = MinMax(q_depth=q_depth)
+            move, _ = run_search(mm, fen, depth)
+            s = mm.stats()
+            print(f"  q_depth {q_depth}: {move} ({mm.best_score}), {s['nodes']} nodes + {s['q_nodes']} q-nodes in {s['time']:.2f}s")
+
+def bench_mate(fen="6k1/8/6K1/8/8/8/8/7R w - - 0 1", time_limit=30):
+
+    print("Iterative deepening on a forced mate")
+    mm = MinMax()
+    board = chess.Board(fen)
+    start = time.time()
+    move = mm.run_iterative_deepening(board, time_limit)
+    elapsed = time.time() - start
+    # The search stops at the depth the mate is found instead of running out the clock
+    assert is_mate(mm.best_score) and mm.completed_depth == mate_plies(mm.best_score)
+    print(f"  {move}: mate in {(mate_plies(mm.best_score) + 1) // 2} found at depth {mm.completed_depth} in {elapsed:.2f}s of {time_limit}s")
+
+def bench_parallel(depth=4, worker_counts=(1, 2, 4, 8, 16, 32)):
+
+    print(f"Root-parallel search (depth {depth}, {os.cpu_count()} CPUs)")
+    serial_time = 0
+    for fen in positions:
+        _, t = run_search(MinMax(), fen, depth)
+        serial_time += t
+    print(f"  serial:     {serial_time:.2f}s")
+
+    base = None
+    for workers in worker_counts:
+        mm = MinMax(workers=workers)
+        # Start the worker processes outside the timing
+        start = time.time()
+        mm.run_minmax_parallel(1, chess.Board(), True)
+        startup = time.time() - start
+        moves = []
+        start = time.time()
+        for fen in positions:
+            board = chess.Board(fen)
+            moves.append(mm.run_minmax_parallel(depth, board, board.turn == chess.WHITE))
+        elapsed = time.time() - start
+        mm.close()
+        if base is None:
+            base = elapsed
+        print(f"  {workers:>2} workers: {elapsed:.2f}s (+{startup:.2f}s startup), speedup {base/elapsed:.2f}x vs 1 worker, {serial_time/elapsed:.2f}x vs serial ({' '.join(str(m) for m in moves)})")
+
+def random_layers(seed=0, hidden=(512, 256)):
+    # Untrained network with the evaluator's input/output shape, for timing only
+    rng = np.random.default_rng(seed)
+    sizes = (768,) + hidden + (1,)
+    layers = []
+    for a, b in zip(sizes, sizes[1:]):
+        layers.append((rng.standard_normal((a, b)).astype(np.float32) * 0.05, np.zeros(b, dtype=np.float32), 'relu'))
+    W, b, _ = layers[-1]
+    layers[-1] = (W, b, 'sigmoid')
+    return layers
+
+def bench_batched_eval(depth=3, batch_sizes=(1, 32, 256)):
+
+    print(f"Batched network evaluation (depth {depth})")
+    predict = NumpyMLP(random_layers()).predict
+    for batch_size in batch_sizes:
+        evaluator = BatchEvaluator(predict, batch_size=batch_size)
+        nodes = 0
+        start = time.time()
+        for fen in positions:
+            mm = MinMax(evaluator=evaluator)
+            run_search(mm, fen, depth)
+            nodes += mm.nodes
+        elapsed = time.time() - start
+        s = evaluator.stats()
+        print(f"  batch size {batch_size:>3}: {nodes/elapsed:.0f} nodes/s, {s['batches']} batches (avg {s['avg_batch']:.1f} positions)")
+
+def bench_numpy_mlp(batch_size=256, repeats=50):
+
+    print(f"NumPy MLP inference (batch size {batch_size})")
+    layers = random_layers()
+    X = (np.random.default_rng(1).random((batch_size, 768)) < 0.04).astype(np.float32)
+    reference = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for quantized in (False, True):
+            path = os.path.join(tmp, f"mlp_{int(quantized)}.npz")
+            save_weights(path, layers, quantized)
+            start = time.time()
+            mlp = NumpyMLP.load(path)
+            load_time = time.time() - start
+            start = time.time()
+            for _ in range(repeats):
+                out = mlp.predict(X)
+            latency = (time.time() - start) / repeats
+            if reference is None:
+                reference = out
+            label = "int8:   " if quantized else "float32:"
+            print(f"  {label} {os.path.getsize(path)/1024:.0f} KB, load {load_time*1000:.1f}ms, {latency*1000:.2f}ms/batch, max diff {np.abs(out - reference).max():.2e}")
+
+    try:
+        start = time.time()
+        import keras
+    except ImportError:
+        print("  keras not installed, skipping comparison")
+        return
+    model = keras.Sequential([keras.Input(shape=(768,))] + [keras.layers.Dense(W.shape[1], activation=a) for W, _, a in layers])
+    model.set_weights([w for W, b, _ in layers for w in (W, b)])
+    model.predict_on_batch(X)
+    startup = time.time() - start
+    start = time.time()
+    for _ in range(repeats):
+        expected = model.predict_on_batch(X)
+    latency = (time.time() - start) / repeats
+    print(f"  keras:   startup {startup:.2f}s, {latency*1000:.2f}ms/batch, max diff vs NumPy {np.abs(np.asarray(expected) - reference).max():.2e}")
+
+def legacy_get_bit_map(node):
+    # get_bit_map before it was vectorized, kept as the baseline
+    data_individual = []
+    for color in (chess.WHITE, chess.BLACK):
+        for piece_type in (chess.PAWN, chess.ROOK, chess.KNIGHT, chess.BISHOP, chess.QUEEN, chess.KING):
+            data_individual.extend(np.fromstring('{:064b}'.format(int(node.pieces(piece_type, color))).replace('', ' '), dtype=int, sep=' ').tolist())
+    return data_individual
+
+def random_boards(count, seed=0, max_plies=80):
+    import random
+    rng = random.Random(seed)
+    boards = []
+    board = chess.Board()
+    while len(boards) < count:
+        moves = list(board.legal_moves)
+        if not moves or len(board.move_stack) >= max_plies:
+            board = chess.Board()
+            continue
+        board.push(rng.choice(moves))
+        boards.append(board.copy(stack=False))
+    return boards
+
+def bench_encoder(count=5000):
+
+    print(f"Board encoding ({count} positions)")
+    import warnings
+    boards = random_boards(count)
+    legacy = []
+    start = time.time()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        for board in boards:
+            legacy.append(legacy_get_bit_map(board))
+    legacy_time = time.time() - start
+
+    start = time.time()
+    for board in boards:
+        encode_board(board)
+    single_time = time.time() - start
+
+    start = time.time()
+    encoded = encode_boards(boards)
+    batch_time = time.time() - start
+
+    assert (encoded == np.array(legacy, dtype=np.uint8)).all()
+    assert get_bit_map(boards[-1]) == legacy[-1]
+    print(f"  legacy get_bit_map: {count/legacy_time:.0f} positions/s")
+    print(f"  encode_board:       {count/single_time:.0f} positions/s")
+    print(f"  encode_boards:      {count/batch_time:.0f} positions/s")
+
+def bench_data_loader(samples=500000, batch_size=1024, thread_counts=(1, 2, 4)):
+
+    print(f"Data loader ({samples} samples, batch size {batch_size})")
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data")
+        with DatasetWriter(path) as writer:
+            for start in range(0, samples, 50000):
+                n = min(50000, samples - start)
+                writer.extend((rng.random((n, 768)) < 0.04).astype(np.uint8), rng.random(n))
+        for threads in thread_counts:
+            loader = DataLoader(path, batch_size=batch_size, threads=threads)
+            start = time.time()
+            count = sum(len(y) for _, y in loader)
+            elapsed = time.time() - start
+            print(f"  {threads} threads: {count/elapsed:.0f} samples/s")
+
+def bench_import_time(modules=('minmax', 'neural_eval', 'numpy_mlp'), repeats=5):
+
+    print("Import time (fresh interpreter)")
+    heavy = ('graphics', 'tkinter', 'PIL', 'keras', 'tensorflow')
+    for module in modules:
+        code = ("import sys, time; start = time.perf_counter(); import " + module +
+                "; print(time.perf_counter() - start); print(' '.join(m for m in " + repr(heavy) + " if m in sys.modules))")
+        times = []
+        for _ in range(repeats):
+            out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                 cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split('\n')
+            times.append(float(out[0]))
+        loaded = out[1] or "none"
+        print(f"  {module}: {min(times)*1000:.0f}ms, GUI/ML modules loaded: {loaded}")
+
+def main():
+    bench_import_time()
+    bench_transposition()
+    bench_move_ordering()
+    bench_quiescence()
+    bench_mate()
+    bench_parallel()
+    bench_batched_eval()
+    bench_numpy_mlp()
+    bench_encoder()
+    bench_data_loader()
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,10 @@ import chess.engine
 from graphics import *
 import numpy as np
 import traceback
+import os
 import math as m
 import time
+import threading
 
 graphic_board = None
 scale = 70
@@ -22,27 +24,35 @@ piece_highlighted_color = color_rgb(118, 247, 150)
 background_color = color_rgb(33,33,33) 
 under_check_color = color_rgb(247, 118, 118)
 
-win = GraphWin("Chess.py by Sharven", width + 100, height)
-win.setBackground(background_color)
 animation_speed = 100 # Higher is slower
 
-value_text = Text(Point(width + 50, 50), 'Score')
-value_text.setFace('courier')
-value_text.setSize(16)
-value_text.setStyle("bold")
-value_text.setTextColor('white')
-value_text.draw(win)
+# Created by init_window when main runs
+win = None
+value_text = None
+info_text = None
 
-EVAL_TIME = 0.100
+THINK_TIME = 1
+PONDER = True
+POLL_INTERVAL = 0.05
 
-piece_value_dict = {
-    'P' : 1,
-    'R' : 5,
-    'N' : 3,
-    'B' : 3,
-    'Q' : 9,
-    'K' : 100,
-}
+def init_window():
+    global win, value_text, info_text
+
+    win = GraphWin("Chess.py by Sharven", width + 100, height)
+    win.setBackground(background_color)
+
+    value_text = Text(Point(width + 50, 50), 'Score')
+    value_text.setFace('courier')
+    value_text.setSize(16)
+    value_text.setStyle("bold")
+    value_text.setTextColor('white')
+    value_text.draw(win)
+
+    info_text = Text(Point(width + 50, 80), '')
+    info_text.setFace('courier')
+    info_text.setSize(10)
+    info_text.setTextColor('white')
+    info_text.draw(win)
 
 def init_graphics(board, graphic_board):
 
@@ -76,16 +86,34 @@ def undraw_all(graphic_board):
             if c != None:
                 c.graphics_object.undraw()
 
+def png_size(path):
+    # Width and height from the IHDR chunk, without decoding the image
+    with open(path, 'rb') as f:
+        header = f.read(24)
+    return int.from_bytes(header[16:20], 'big'), int.from_bytes(header[20:24], 'big')
+
 def resize_images():
-    from PIL import Image
     list_of_original_images = os.listdir('data/original')
     new_size = int(60 * image_scale)
-    for file in list_of_original_images:
+    outdated = [file for file in list_of_original_images
+                if not os.path.exists("data/scaled/"+file) or png_size("data/scaled/"+file) != (new_size, new_size)]
+    if not outdated:
+        return
+    from PIL import Image
+    for file in outdated:
         imageFile = "data/original/"+file
         im1 = Image.open(imageFile)
-        im5 = im1.resize((new_size, new_size), Image.ANTIALIAS)
+        im5 = im1.resize((new_size, new_size), Image.LANCZOS)
         im5.save("data/scaled/"+file)
 
+sprite_cache = {}
+
+def get_sprite(name):
+    # Each piece image is read from disk once and cloned from then on
+    if name not in sprite_cache:
+        sprite_cache[name] = Image(Point(0, 0), 'data/scaled/'+name+'.png')
+    return sprite_cache[name]
+
 def unhighlight_all_squares():
     for row in range(8):
         for col in range(8):
@@ -120,6 +148,15 @@ def calculate_index_position(x, y):
     col = x/square_width
     return (int(m.floor(row)), int(m.floor(col)) )
 
+def create_piece(r, c, side_id):
+    s = 'W'
+    if side_id.islower():
+        s = 'B'
+    p = calculate_real_position(r, c)
+    image = get_sprite(s+side_id.upper()).clone()
+    image.move(p[0], p[1])
+    return Piece((r,c), image, 1 - side_id.islower(), side_id)
+
 def convert_position_board_to_actual(acc_board):
 
     board = np.empty((8,8), dtype=Piece)
@@ -128,27 +165,47 @@ def convert_position_board_to_actual(acc_board):
         c = i-((i//8)*8)
         piece_id = acc_board.piece_at(i)
         if piece_id != None:
-            side_id = str(piece_id)
-            s = 'W'
-            if side_id.islower():
-                s = 'B'
-            p = calculate_real_position(r, c)
-            if side_id.lower() == 'p':
-                board[r][c] = Piece((r,c), Image(Point(p[0], p[1]), 'data/scaled/'+s+'P.png'), 1 - side_id.islower(), side_id)
-            elif side_id.lower() == 'n':
-                board[r][c] = Piece((r,c), Image(Point(p[0], p[1]), 'data/scaled/'+s+'N.png'), 1 - side_id.islower(), side_id)
-            elif side_id.lower() == 'b':
-                board[r][c] = Piece((r,c), Image(Point(p[0], p[1]), 'data/scaled/'+s+'B.png'), 1 - side_id.islower(), side_id)
-            elif side_id.lower() == 'r':
-                board[r][c] = Piece((r,c), Image(Point(p[0], p[1]), 'data/scaled/'+s+'R.png'), 1 - side_id.islower(), side_id)
-            elif side_id.lower() == 'q':
-                board[r][c] = Piece((r,c), Image(Point(p[0], p[1]), 'data/scaled/'+s+'Q.png'), 1 - side_id.islower(), side_id)
-            elif side_id.lower() == 'k':
-                board[r][c] = Piece((r,c), Image(Point(p[0], p[1]), 'data/scaled/'+s+'K.png'), 1 - side_id.islower(), side_id)
+            board[r][c] = create_piece(r, c, str(piece_id))
         else:
             board[r][c] = None
     return board
 
+def update_graphic_board(acc_board, graphic_board):
+    """
+    Brings graphic_board in line with acc_board by touching only the squares
+    that changed. Pieces that left a square are moved to a square that now
+    holds the same piece, so castling and en passant just move existing
+    images; an image is only created for a promoted piece, and pieces left
+    over (captures, the promoting pawn) are undrawn.
+    """
+    vacated = {}
+    arrived = []
+    for i in range(64):
+        r, c = conver_int_to_position(i)
+        piece_id = acc_board.piece_at(i)
+        side_id = str(piece_id) if piece_id != None else None
+        current = graphic_board[r][c]
+        if (current.symbol if current != None else None) != side_id:
+            if current != None:
+                vacated.setdefault(current.symbol, []).append(current)
+            graphic_board[r][c] = None
+            if side_id != None:
+                arrived.append((r, c, side_id))
+
+    for r, c, side_id in arrived:
+        if vacated.get(side_id):
+            piece = vacated[side_id].pop()
+            piece.graphics_object.move((c - piece.position[1])*square_width, (r - piece.position[0])*square_height)
+            piece.position = (r, c)
+        else:
+            piece = create_piece(r, c, side_id)
+            piece.graphics_object.draw(win)
+        graphic_board[r][c] = piece
+
+    for pieces in vacated.values():
+        for piece in pieces:
+            piece.graphics_object.undraw()
+
 def conver_int_to_position(square_int):
     r = 7-(square_int//8)
     c = square_int-((square_int//8)*8)
@@ -172,6 +229,152 @@ def graphic_board_move(board, graphic_board, start, end):
     for i in range(animation_speed):
         piece.graphics_object.move(step_x, step_y)
 
+class MinMaxPlayer:
+    """
+    Plays with the built-in search, think_time seconds per move. progress()
+    reports the last completed iteration while the search is running.
+    """
+
+    def __init__(self, mm, think_time):
+        self.mm = mm
+        self.think_time = think_time
+
+    def search(self, board, stop, ponder=False):
+        # A ponder search runs until stopped or until ponderhit gives it a deadline
+        move = self.mm.run_iterative_deepening(board, None if ponder else self.think_time, stop=stop)
+        pv = self.mm.pv
+        return move, self.mm.best_score, pv[1] if len(pv) > 1 else None
+
+    def start_ponder(self):
+        self.mm.start_ponder()
+
+    def ponderhit(self):
+        self.mm.ponderhit(self.think_time)
+
+    def progress(self):
+        pv = self.mm.pv
+        if not pv:
+            return None
+        return self.mm.completed_depth, pv[0], self.mm.best_score
+
+class StockfishPlayer:
+    """
+    Plays with a UCI engine, think_time seconds per move. A single analysis
+    gives the move, the score and the expected reply, and progress() shows
+    its latest info. A ponder search analyses until it is stopped or, after
+    ponderhit, until think_time has passed since it began.
+    """
+
+    # Seconds between checks of the running analysis for stop and ponderhit
+    POLL = 0.01
+
+    def __init__(self, engine, think_time):
+        self.engine = engine
+        self.think_time = think_time
+        self.hit = threading.Event()
+        self.analysis = None
+
+    def search(self, board, stop, ponder=False):
+        start = time.time()
+        limit = None if ponder else chess.engine.Limit(time=self.think_time)
+        with self.engine.analysis(board, limit) as analysis:
+            self.analysis = analysis
+            while not stop.wait(self.POLL) and not analysis_finished(analysis):
+                if self.hit.is_set() and time.time() - start >= self.think_time:
+                    break
+            analysis.stop()
+            best = analysis.wait()
+            info = analysis.info
+        self.analysis = None
+        return best.move, white_score(info), best.ponder
+
+    def start_ponder(self):
+        self.hit.clear()
+
+    def ponderhit(self):
+        self.hit.set()
+
+    def progress(self):
+        analysis = self.analysis
+        if analysis == None:
+            return None
+        info = analysis.info
+        if not info.get('pv'):
+            return None
+        return info.get('depth'), info['pv'][0], white_score(info)
+
+def analysis_finished(analysis):
+    # Consumes the queued info so the end of the analysis can be seen without blocking
+    while not analysis.would_block():
+        if analysis.next() == None:
+            return True
+    return False
+
+def white_score(info):
+    if 'score' not in info:
+        return None
+    return info['score'].white().score(mate_score=100000)/100.0
+
+class SearchThread(threading.Thread):
+    """
+    Runs player.search on a copy of board in the background so the window
+    keeps handling events. stop() asks the search to return early. With
+    predicted set the thread ponders: it searches the position after that
+    move until stopped, or until ponderhit() turns it into a normal search.
+    ponder holds the reply the search expects after its move.
+    """
+
+    def __init__(self, player, board, predicted=None):
+        super().__init__(daemon=True)
+        self.player = player
+        self.board = board.copy()
+        self.predicted = predicted
+        if predicted != None:
+            self.board.push(predicted)
+            # Armed here rather than in run so a ponderhit before the thread starts is not lost
+            player.start_ponder()
+        self.stop_event = threading.Event()
+        self.move = None
+        self.score = None
+        self.ponder = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.move, self.score, self.ponder = self.player.search(self.board, self.stop_event, ponder=self.predicted != None)
+        except Exception as e:
+            self.error = e
+
+    def stop(self):
+        self.stop_event.set()
+
+    def ponderhit(self):
+        self.player.ponderhit()
+
+def show_progress(progress):
+    if progress != None:
+        depth, move, score = progress
+        value_text.setText(str(score))
+        info_text.setText('d' + str(depth) + ' ' + str(move))
+
+def wait_for_search(search):
+    """
+    Keeps the window responsive until search finishes, showing the best move
+    found so far. Clicks made while the AI thinks are ignored. Returns False
+    if the window was closed, after stopping the search.
+    """
+    while search.is_alive():
+        if win.isClosed():
+            search.stop()
+            search.join()
+            return False
+        win.checkMouse()
+        show_progress(search.player.progress())
+        time.sleep(POLL_INTERVAL)
+    if search.error != None:
+        raise search.error
+    return True
+
 class Piece:
 
     def __init__(self, position, graphics_object, side, symbol):
@@ -180,78 +383,15 @@ class Piece:
         self.side = side
         self.symbol = symbol
 
-class MinMax():
-
-    def evaluation_function(self, board):
-        s = 0
-        for i in range(64):
-            a = board.piece_at(i)
-            p = str(a)
-            if a != None:
-                val = piece_value_dict[p.upper()]
-                if p.islower():
-                    val *= -1
-                s += val
-        value_text.setText(str(s))
-        return s
-
-
-    def run_minmax(self, depth, board, is_maximizing_player):
-        list_of_moves = board.legal_moves
-        best = 9000
-        final_move = None
-        for move in list_of_moves:
-            board.push(move)
-            val = self.find_best_move(depth - 1, board, -10000, 10000, not is_maximizing_player)
-            board.pop()
-            if val <= best:
-                best = val
-                final_move = move
-        return final_move
-
-    def find_best_move(self, depth, board, alpha, beta, is_maximizing_player):
-        # return choice(get_all_legal_moves_for_side(-1, curr_state.board))
-        
-        res = board.result()
-        if res == '1-0': 
-            return float('inf')
-        elif res == '0-1': 
-            return -float('inf')
-        elif res == '1/2-1/2':
-            return 0
-
-        if depth == 0:
-            return self.evaluation_function(board)
-
-        if (is_maximizing_player):
-            list_of_legal_moves = board.legal_moves
-            best = -999
-            for move in list_of_legal_moves:
-                board.push(move)
-                best = max(best, self.find_best_move(depth - 1, board, alpha, beta, not is_maximizing_player))
-                board.pop()
-                alpha = max(alpha, best)
-                if beta <= alpha:
-                    return best
-            return best
-        else:
-            list_of_legal_moves = board.legal_moves
-            best = 999
-            for move in list_of_legal_moves:
-                board.push(move)
-                best  = min(best, self.find_best_move(depth - 1, board, alpha, beta, not is_maximizing_player))
-                board.pop()
-                beta = min(beta, best)
-                if beta <= alpha:
-                    return best
-            return best
-
 def main():
         
     engine = chess.engine.SimpleEngine.popen_uci("stockfish10/Windows/stockfish_10_x64.exe")
     board = chess.Board()
-    # mm = MinMax()
+    ai_player = StockfishPlayer(engine, THINK_TIME)
+    # from minmax import MinMax
+    # ai_player = MinMaxPlayer(MinMax(), THINK_TIME)
     resize_images()
+    init_window()
     graphic_board = convert_position_board_to_actual(board)
     init_graphics(board, graphic_board)
 
@@ -260,15 +400,15 @@ def main():
     # while node.variations:
     #     next_node = node.variation(0)
     #     board.push(next_node.move)
-    #     undraw_all(graphic_board)
-    #     graphic_board = convert_position_board_to_actual(board)
-    #     draw_board(board, graphic_board)
+    #     update_graphic_board(board, graphic_board)
     #     node = next_node
     #     time.sleep(0.5)
     
     turn_count = 1
     player = 1
     ai = 0
+    ponder_move = None
+    pondering = None
 
     while True:
 
@@ -282,7 +422,12 @@ def main():
             move = None
 
             if curr_turn == player:
-           
+
+                # Search the reply to the move we expect while waiting for the player
+                if PONDER and pondering == None and ponder_move in board.legal_moves:
+                    pondering = SearchThread(ai_player, board, ponder_move)
+                    pondering.start()
+
                 mouse = win.getMouse()
                 spos = calculate_index_position(mouse.getX(), mouse.getY())
                 
@@ -297,11 +442,19 @@ def main():
 
             elif curr_turn == ai:
                 print('Thinking')
-                # move = mm.run_minmax(5, board, True)
-                move = engine.play(board, chess.engine.Limit(time=1)).move
-                evaluation = engine.analyse(board, chess.engine.Limit(time=EVAL_TIME))
-                score = (evaluation['score'].relative.score()/100.0)*(2*curr_turn-1)
-                value_text.setText(str(score))
+                if pondering != None:
+                    search = pondering
+                    pondering = None
+                else:
+                    search = SearchThread(ai_player, board)
+                    search.start()
+                if not wait_for_search(search):
+                    engine.quit()
+                    quit()
+                move = search.move
+                ponder_move = search.ponder
+                value_text.setText(str(search.score))
+                info_text.setText('')
 
             if move in board.legal_moves:
                 # if curr_turn == ai:
@@ -310,17 +463,27 @@ def main():
                 #     graphic_board_move(board, graphic_board, s, e)
                 # elif curr_turn == player:
                 #     graphic_board_move(board, graphic_board, spos, epos)
+                if pondering != None:
+                    if move == pondering.predicted:
+                        print('Ponder hit')
+                        pondering.ponderhit()
+                    else:
+                        pondering.stop()
+                        pondering.join()
+                        pondering = None
                 print(move)
                 board.push(move)
-                undraw_all(graphic_board)
-                graphic_board = convert_position_board_to_actual(board)
-                draw_board(board, graphic_board)
+                update_graphic_board(board, graphic_board)
                 turn_count += 1
 
             unhighlight_all_squares()
 
         except Exception as e:
             if str(e) == "getMouse in closed window":
+                if pondering != None:
+                    pondering.stop()
+                    pondering.join()
+                engine.quit()
                 quit()
             traceback.print_exc()
 
@@ -1,87 +1,203 @@
 """
-Creates the dataset for the MLP in .json format.
-.json file will contain board-value pairs. 
+Creates the dataset for the MLP in the binary format from dataset.py.
+The dataset will contain board-value pairs.
 
 Vectorize the SquareSet integer mask of the piece
 """
-import json
 import chess.pgn
 import chess.engine
+import multiprocessing
+import multiprocessing.util
+import json
+import os
 import time
-import numpy as np
 import math
+from dataset import DatasetWriter, truncate
+from encoding import encode_board
+from label_cache import LabelCache
+from pgn_positions import stream_positions
+from sampling import PositionSampler
 
 def get_bit_map(node):
-
-    data_individual = [] 
-    # White Pieces
-    data_individual.extend(np.fromstring('{:064b}'.format(int(node.pieces(chess.PAWN, chess.WHITE))).replace('', ' '), dtype=int, sep=' ').tolist())
-    data_individual.extend(np.fromstring('{:064b}'.format(int(node.pieces(chess.ROOK, chess.WHITE))).replace('', ' '), dtype=int, sep=' ').tolist())
-    data_individual.extend(np.fromstring('{:064b}'.format(int(node.pieces(chess.KNIGHT, chess.WHITE))).replace('', ' '), dtype=int, sep=' ').tolist())
-    data_individual.extend(np.fromstring('{:064b}'.format(int(node.pieces(chess.BISHOP, chess.WHITE))).replace('', ' '), dtype=int, sep=' ').tolist())
-    data_individual.extend(np.fromstring('{:064b}'.format(int(node.pieces(chess.QUEEN, chess.WHITE))).replace('', ' '), dtype=int, sep=' ').tolist())
-    data_individual.extend(np.fromstring('{:064b}'.format(int(node.pieces(chess.KING, chess.WHITE))).replace('', ' '), dtype=int, sep=' ').tolist())
-
-    # Black Pieces
-    data_individual.extend(np.fromstring('{:064b}'.format(int(node.pieces(chess.PAWN, chess.BLACK))).replace('', ' '), dtype=int, sep=' ').tolist())
-    data_individual.extend(np.fromstring('{:064b}'.format(int(node.pieces(chess.ROOK, chess.BLACK))).replace('', ' '), dtype=int, sep=' ').tolist())
-    data_individual.extend(np.fromstring('{:064b}'.format(int(node.pieces(chess.KNIGHT, chess.BLACK))).replace('', ' '), dtype=int, sep=' ').tolist())
-    data_individual.extend(np.fromstring('{:064b}'.format(int(node.pieces(chess.BISHOP, chess.BLACK))).replace('', ' '), dtype=int, sep=' ').tolist())
-    data_individual.extend(np.fromstring('{:064b}'.format(int(node.pieces(chess.QUEEN, chess.BLACK))).replace('', ' '), dtype=int, sep=' ').tolist())
-    data_individual.extend(np.fromstring('{:064b}'.format(int(node.pieces(chess.KING, chess.BLACK))).replace('', ' '), dtype=int, sep=' ').tolist())
-
-    return data_individual
+    return encode_board(node).tolist()
 
 def sigmoid(x):
-    return 1/(1+(math.e**-x))
+    # Split on the sign so mate scores (+-1000000) do not overflow math.e**-x
+    if x >= 0:
+        return 1/(1+(math.e**-x))
+    z = math.e**x
+    return z/(1+z)
+
+def white_score(board, evaluation):
+    return (2*int(board.turn) -1) * (evaluation['score'].relative.score(mate_score=1000000))
+
+ENGINE_PATH = "stockfish10/Windows/stockfish_10_x64.exe"
+
+_engine = None
+_limit = None
+_cache = None
+
+def _init_engine(engine_path, threads, hash_mb, evaluation_time, cache_path):
+    global _engine, _limit, _cache
+    _engine = chess.engine.SimpleEngine.popen_uci(engine_path)
+    _engine.configure({'Threads': threads, 'Hash': hash_mb})
+    _limit = chess.engine.Limit(time=evaluation_time)
+    # Runs when the pool shuts its workers down cleanly
+    multiprocessing.util.Finalize(None, _engine.quit, exitpriority=10)
+    if cache_path is not None:
+        _cache = LabelCache(cache_path, f"time={evaluation_time}")
+
+def _label_task(task):
+    tag, fen = task
+    board = chess.Board(fen)
+    score = _cache.get(board) if _cache is not None else None
+    cached = score is not None
+    if not cached:
+        score = white_score(board, _engine.analyse(board, _limit))
+        if _cache is not None:
+            _cache.put(board, score)
+    return tag, encode_board(board), sigmoid(score), cached
+
+class LabelingPool():
+    """
+    Labels positions with a pool of engine processes, each running its own
+    Stockfish with the given Threads and Hash settings. With cache_path set,
+    scores are looked up in and added to a LabelCache at that path.
+    """
+
+    def __init__(self, engines=None, threads=1, hash_mb=16, evaluation_time=1, engine_path=ENGINE_PATH, cache_path=None):
+        self.engines = engines or os.cpu_count()
+        self.pool = multiprocessing.Pool(self.engines, initializer=_init_engine,
+                                         initargs=(engine_path, threads, hash_mb, evaluation_time, cache_path))
+
+    def label(self, tasks):
+        """
+        tasks is an iterable of (tag, fen) pairs, consumed lazily. Yields
+        (tag, bits, label, cached) in the same order as tasks, where bits is
+        the encode_board encoding of the position and cached tells whether
+        the score came from the cache.
+        """
+        return self.pool.imap(_label_task, tasks)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as infile:
+        return json.load(infile)
+
+def save_checkpoint(path, checkpoint):
+    # Written to a temporary file first so a crash never leaves half a checkpoint
+    with open(path + '.tmp', 'w') as outfile:
+        json.dump(checkpoint, outfile)
+    os.replace(path + '.tmp', path)
+
+def save_progress(checkpoint_path, writer, sampler, game_index, previous=None):
+    """
+    Flushes the dataset and checkpoints that every game before game_index
+    has been written, together with the sampler state as of that point.
+    Returns the sampler state path, to pass as previous next time so the
+    old state is removed once the new checkpoint is in place.
+    """
+    writer.flush()
+    sampler.commit(game_index)
+    sampler_path = os.path.splitext(checkpoint_path)[0] + f'.sampler-{game_index}.npz'
+    sampler.save(sampler_path)
+    save_checkpoint(checkpoint_path, {'game_index': game_index, 'samples': len(writer), 'sampler': sampler_path})
+    if previous is not None and previous != sampler_path and os.path.exists(previous):
+        os.remove(previous)
+    return sampler_path
+
+def print_elapsed(start):
+    end = time.time()
+    hours, rem = divmod(end-start, 3600)
+    minutes, seconds = divmod(rem, 60)
+    print(f"Time Elapsed:", "{:0>2}:{:0>2}:{:05.2f}".format(int(hours), int(minutes), seconds))
 
 def main():
-
-    engine = chess.engine.SimpleEngine.popen_uci("stockfish10/Windows/stockfish_10_x64.exe")
-    X = []
-    Y = []
-    pgn = open("datasets/ficsgamesdb_2018_CvC_nomovetimes_51973.pgn")
-    state_limit = 60
+    dataset_path = 'data'
+    checkpoint_path = dataset_path + '.checkpoint.json'
+    pgn_path = "datasets/ficsgamesdb_2018_CvC_nomovetimes_51973.pgn"
+    state_limit = None
+    phase_limit = 20
     games = 300
     evaluation_time = 1
+    engines = os.cpu_count()
+    engine_threads = 1
+    engine_hash = 16
+    parsers = 2
+    checkpoint_every = 1000
+    cache_path = 'labels.sqlite'
+    # Set to replace a dataset already at dataset_path that has no checkpoint to resume from
+    overwrite = False
     start = time.time()
 
-    print(f"Parsing {games} games.")
-
-    for i in range(games):
-
-        game = chess.pgn.read_game(pgn)
-        board = game.board()
+    # The checkpoint points at the first game not written yet and holds the
+    # dedup filter and phase counts as they were before that game, so a
+    # resumed run samples exactly what an uninterrupted one would. Checkpoints
+    # are only taken between games; samples written after the last one are
+    # dropped and their game is labelled again.
+    sampler = PositionSampler(phase_limit=phase_limit)
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint is None:
+        existing = [path for path in (dataset_path + '.pos', dataset_path + '.lbl') if os.path.exists(path)]
+        if existing and not overwrite:
+            print(f"{' and '.join(existing)} already exist with no checkpoint to resume from.")
+            print("Move them away, or set overwrite to start a new dataset over them.")
+            return
+        checkpoint = {'game_index': 0, 'samples': 0, 'sampler': None}
+        truncate(dataset_path, 0)
+    else:
+        truncate(dataset_path, checkpoint['samples'])
+        if checkpoint['sampler'] is not None:
+            sampler.load(checkpoint['sampler'])
+        print(f"Resuming at game {checkpoint['game_index']+1} ({checkpoint['samples']} samples).")
+    writer = DatasetWriter(dataset_path)
+    resumed_samples = len(writer)
+    sampler_path = checkpoint['sampler']
+
+    print(f"Parsing {games} games with {engines} engines.")
+
+    positions = sampler.filter(stream_positions(pgn_path, games, state_limit, checkpoint['game_index'], workers=parsers))
+    cache_hits = 0
+    with LabelingPool(engines, engine_threads, engine_hash, evaluation_time, cache_path=cache_path) as labeler:
+        current_game = checkpoint['game_index']
         states = 0
-        print("Game:", i+1, f"({game.headers['Event']})")
-
-        for next_node in game.mainline_moves(): 
-            
-            evaluation = engine.analyse(board, chess.engine.Limit(time=evaluation_time))
-            score = sigmoid((2*int(board.turn) -1) * (evaluation['score'].relative.score(mate_score=1000000)))
-            X.append(get_bit_map(board))
-            Y.append(score)
+        last_checkpoint = len(writer)
+        for (game_index, state_index), bits, score, cached in labeler.label(positions):
+            cache_hits += cached
+            if game_index != current_game:
+                print("Game:", current_game+1, "States:", states)
+                print_elapsed(start)
+                current_game = game_index
+                states = 0
+                if len(writer) - last_checkpoint >= checkpoint_every:
+                    sampler_path = save_progress(checkpoint_path, writer, sampler, game_index, sampler_path)
+                    last_checkpoint = len(writer)
+            writer.append(bits, score)
             states += 1
+        print("Game:", current_game+1, "States:", states)
+        print_elapsed(start)
 
-            board.push(next_node)
-
-            if states >= state_limit:
-                break
-
-        end = time.time()
-        print("States:", states)
-        hours, rem = divmod(end-start, 3600)
-        minutes, seconds = divmod(rem, 60)
-        print(f"Time Elapsed:", "{:0>2}:{:0>2}:{:05.2f}".format(int(hours), int(minutes), seconds))
-
-    engine.quit()
+    save_progress(checkpoint_path, writer, sampler, games, sampler_path)
+    writer.close()
 
     print("Dataset created")
-    print("Samples:", len(X), "Labels:", len(Y))
-    print("Dumping to JSON")
-
-    with open('data.json', 'w') as outfile:
-        json.dump([X,Y], outfile)
+    print("Samples:", len(writer))
+    print(sampler.report())
+    labelled = len(writer) - resumed_samples
+    print(f"Throughput: {labelled/(time.time()-start):.2f} positions/s")
+    if labelled:
+        print(f"Cache hits: {cache_hits}/{labelled} ({cache_hits/labelled:.1%}), {cache_hits*evaluation_time:.0f} engine-seconds saved")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
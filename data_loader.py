@@ -0,0 +1,159 @@
+"""
+Streaming training data loader for datasets written by create_data.py.
+
+Shards are read block by block through their memory maps, mixed in a
+bounded shuffle buffer, and decoded from packed bits to float32 batches on
+background threads, so memory use does not grow with the dataset size.
+"""
+import queue
+import threading
+import numpy as np
+from dataset import Dataset, unpack_positions
+
+_done = object()
+
+class _Stopped(Exception):
+    pass
+
+def _put(q, item, stop):
+    # Blocking put that gives up once the consumer has stopped iterating
+    while True:
+        if stop.is_set():
+            raise _Stopped()
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+class DataLoader():
+    """
+    Iterates over (X, y) batches, X an (N, 768) float32 array and y an (N,)
+    float32 array, from the datasets at paths. Every iteration is one epoch
+    in a new random order.
+
+    Blocks of block_size samples are read in random order and fed into a
+    buffer of shuffle_buffer samples, from which each batch is drawn at
+    random. threads decode batches in the background and up to prefetch
+    decoded batches are kept ready.
+    """
+
+    def __init__(self, paths, batch_size=256, shuffle_buffer=65536, block_size=4096, threads=2, prefetch=8, seed=0, drop_last=False):
+        if isinstance(paths, str):
+            paths = [paths]
+        self.datasets = [Dataset(path) for path in paths]
+        self.batch_size = batch_size
+        self.shuffle_buffer = max(shuffle_buffer, batch_size)
+        self.block_size = block_size
+        self.threads = threads
+        self.prefetch = prefetch
+        self.seed = seed
+        self.drop_last = drop_last
+        self.epoch = 0
+
+    def __len__(self):
+        # Batches per epoch
+        samples = sum(len(d) for d in self.datasets)
+        if self.drop_last:
+            return samples // self.batch_size
+        return (samples + self.batch_size - 1) // self.batch_size
+
+    def samples(self):
+        return sum(len(d) for d in self.datasets)
+
+    def blocks(self, rng):
+        blocks = [(d, start) for d in self.datasets for start in range(0, len(d), self.block_size)]
+        rng.shuffle(blocks)
+        for d, start in blocks:
+            stop = min(start + self.block_size, len(d))
+            yield np.array(d.positions[start:stop]), np.array(d.labels[start:stop])
+
+    def shuffle(self, rng, packed_queue, stop):
+        """
+        Fills the shuffle buffer from the blocks and puts randomly drawn
+        packed batches on packed_queue.
+        """
+        positions = np.empty((self.shuffle_buffer, 96), dtype=np.uint8)
+        labels = np.empty(self.shuffle_buffer, dtype=np.float32)
+        size = 0
+        for block_positions, block_labels in self.blocks(rng):
+            i = 0
+            while i < len(block_labels):
+                if size < self.shuffle_buffer:
+                    n = min(self.shuffle_buffer - size, len(block_labels) - i)
+                    positions[size:size + n] = block_positions[i:i + n]
+                    labels[size:size + n] = block_labels[i:i + n]
+                    size += n
+                    i += n
+                    continue
+                # Buffer full: emit a random batch and refill its slots
+                n = min(self.batch_size, len(block_labels) - i)
+                picks = rng.choice(size, self.batch_size, replace=False)
+                _put(packed_queue, (positions[picks].copy(), labels[picks].copy()), stop)
+                slots = picks[:n]
+                positions[slots] = block_positions[i:i + n]
+                labels[slots] = block_labels[i:i + n]
+                if n < self.batch_size:
+                    # Fewer new samples than slots: compact the buffer
+                    keep = np.ones(size, dtype=bool)
+                    keep[picks[n:]] = False
+                    positions[:size - (self.batch_size - n)] = positions[:size][keep]
+                    labels[:size - (self.batch_size - n)] = labels[:size][keep]
+                    size -= self.batch_size - n
+                i += n
+
+        order = rng.permutation(size)
+        for start in range(0, size, self.batch_size):
+            picks = order[start:start + self.batch_size]
+            if self.drop_last and len(picks) < self.batch_size:
+                break
+            _put(packed_queue, (positions[picks].copy(), labels[picks].copy()), stop)
+
+    def decode(self, packed_queue, batch_queue, stop):
+        try:
+            while True:
+                item = packed_queue.get()
+                if item is _done:
+                    _put(batch_queue, _done, stop)
+                    return
+                positions, labels = item
+                _put(batch_queue, (unpack_positions(positions).astype(np.float32), labels), stop)
+        except _Stopped:
+            pass
+
+    def __iter__(self):
+        rng = np.random.default_rng((self.seed, self.epoch))
+        self.epoch += 1
+        packed_queue = queue.Queue(self.prefetch)
+        batch_queue = queue.Queue(self.prefetch)
+        stop = threading.Event()
+
+        def produce():
+            try:
+                self.shuffle(rng, packed_queue, stop)
+                for _ in range(self.threads):
+                    _put(packed_queue, _done, stop)
+            except _Stopped:
+                pass
+
+        workers = [threading.Thread(target=produce, daemon=True)]
+        workers += [threading.Thread(target=self.decode, args=(packed_queue, batch_queue, stop), daemon=True) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+
+        try:
+            finished = 0
+            while finished < self.threads:
+                item = batch_queue.get()
+                if item is _done:
+                    finished += 1
+                    continue
+                yield item
+        finally:
+            # Unblocks the threads if iteration stopped early
+            stop.set()
+            for _ in range(self.threads):
+                try:
+                    packed_queue.put_nowait(_done)
+                except queue.Full:
+                    pass
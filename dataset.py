@@ -0,0 +1,131 @@
+"""
+Binary dataset format for board-value pairs.
+
+A dataset stored at path is a pair of raw files that can be appended to:
+    path.pos - positions, 96 bytes each (the 768-bit encoding from
+               encoding.encode_board, packed with np.packbits)
+    path.lbl - labels, one little-endian float32 each
+
+Dataset memory-maps both files and exposes them as NumPy arrays.
+"""
+import json
+import os
+import sys
+import numpy as np
+from encoding import POSITION_BYTES, pack_positions, unpack_positions
+
+LABEL_DTYPE = np.dtype('<f4')
+
+class DatasetWriter():
+    """
+    Appends positions and labels to the dataset at path, buffering up to
+    chunk_size samples between writes.
+    """
+
+    def __init__(self, path, chunk_size=4096):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.pos_file = open(path + '.pos', 'ab')
+        self.lbl_file = open(path + '.lbl', 'ab')
+        self.positions = []
+        self.labels = []
+        self.written = os.path.getsize(path + '.lbl') // LABEL_DTYPE.itemsize
+
+    def __len__(self):
+        return self.written + len(self.labels)
+
+    def append(self, bits, label):
+        self.positions.append(bits)
+        self.labels.append(label)
+        if len(self.labels) >= self.chunk_size:
+            self.flush()
+
+    def extend(self, bits, labels):
+        self.flush()
+        labels = np.asarray(labels, dtype=LABEL_DTYPE)
+        self.pos_file.write(pack_positions(bits).tobytes())
+        self.lbl_file.write(labels.tobytes())
+        self.written += len(labels)
+
+    def flush(self):
+        if self.labels:
+            self.pos_file.write(pack_positions(self.positions).tobytes())
+            self.lbl_file.write(np.asarray(self.labels, dtype=LABEL_DTYPE).tobytes())
+            self.written += len(self.labels)
+            self.positions = []
+            self.labels = []
+        self.pos_file.flush()
+        self.lbl_file.flush()
+
+    def close(self):
+        self.flush()
+        self.pos_file.close()
+        self.lbl_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class Dataset():
+    """
+    Read-only memory-mapped view of the dataset at path. positions is an
+    (N, 96) uint8 array of packed boards and labels an (N,) float32 array.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        pos_size = os.path.getsize(path + '.pos') // POSITION_BYTES
+        lbl_size = os.path.getsize(path + '.lbl') // LABEL_DTYPE.itemsize
+        # A partially written chunk at the end is ignored
+        self.size = min(pos_size, lbl_size)
+        if self.size == 0:
+            self.positions = np.empty((0, POSITION_BYTES), dtype=np.uint8)
+            self.labels = np.empty(0, dtype=LABEL_DTYPE)
+        else:
+            self.positions = np.memmap(path + '.pos', dtype=np.uint8, mode='r', shape=(self.size, POSITION_BYTES))
+            self.labels = np.memmap(path + '.lbl', dtype=LABEL_DTYPE, mode='r', shape=(self.size,))
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        # A single index gives one (768,) board, a slice an (n, 768) array
+        positions = self.positions[i]
+        if positions.ndim == 1:
+            return unpack_positions(positions)[0], self.labels[i]
+        return unpack_positions(positions), self.labels[i]
+
+    def bits(self, start=0, stop=None):
+        return unpack_positions(self.positions[start:stop])
+
+def truncate(path, size):
+    """
+    Cuts the dataset at path down to its first size samples, dropping
+    anything written after the last checkpoint.
+    """
+    with open(path + '.pos', 'ab') as f:
+        f.truncate(size * POSITION_BYTES)
+    with open(path + '.lbl', 'ab') as f:
+        f.truncate(size * LABEL_DTYPE.itemsize)
+
+def convert_json(json_path, path):
+    """
+    Converts a data.json file written by the old create_data.main, holding
+    [X, Y] with X a list of 768-int lists, into a binary dataset at path.
+    """
+    with open(json_path) as infile:
+        X, Y = json.load(infile)
+    with DatasetWriter(path) as writer:
+        writer.extend(np.array(X, dtype=np.uint8), Y)
+    return len(Y)
+
+def main():
+    json_path = sys.argv[1] if len(sys.argv) > 1 else 'data.json'
+    path = sys.argv[2] if len(sys.argv) > 2 else 'data'
+    count = convert_json(json_path, path)
+    print(f"Converted {count} samples from {json_path} to {path}.pos/{path}.lbl")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Board encoding shared by the labeling pipeline, the datasets and the search.
+
+A board is encoded as 768 bits, the 12 piece bitboards in piece_order. The
+datasets store these bits packed into POSITION_BYTES bytes per position.
+"""
+import chess
+import numpy as np
+
+POSITION_BYTES = 96
+
+# Order of the 12 bitboards in the 768-bit encoding
+piece_order = [(piece_type, color) for color in (chess.WHITE, chess.BLACK)
+               for piece_type in (chess.PAWN, chess.ROOK, chess.KNIGHT, chess.BISHOP, chess.QUEEN, chess.KING)]
+
+def get_piece_masks(node):
+    return [node.pieces_mask(piece_type, color) for piece_type, color in piece_order]
+
+def encode_board(node, out=None):
+    """
+    Encodes a board as 768 uint8 bits: the 12 piece bitboards in piece_order,
+    each from square 63 (h8) down to square 0 (a1). Writes into out if given.
+    """
+    masks = np.array(get_piece_masks(node), dtype='>u8')
+    if out is None:
+        return np.unpackbits(masks.view(np.uint8))
+    out[:] = np.unpackbits(masks.view(np.uint8))
+    return out
+
+def encode_boards(nodes):
+    """
+    Encodes a list of boards into an (N, 768) uint8 array.
+    """
+    masks = np.empty((len(nodes), 12), dtype='>u8')
+    for i, node in enumerate(nodes):
+        masks[i] = get_piece_masks(node)
+    return np.unpackbits(masks.view(np.uint8), axis=1)
+
+def pack_positions(bits):
+    return np.packbits(np.asarray(bits, dtype=np.uint8).reshape(-1, 768), axis=1)
+
+def unpack_positions(packed):
+    return np.unpackbits(np.asarray(packed, dtype=np.uint8).reshape(-1, POSITION_BYTES), axis=1)
@@ -0,0 +1,52 @@
+"""
+Persistent cache of engine evaluations for create_data.py.
+
+Scores are stored in an sqlite database keyed by the Zobrist hash of the
+position and a description of the analysis limit, so duplicate positions
+are only analysed once across games and across runs.
+"""
+import sqlite3
+import chess.polyglot
+
+class LabelCache():
+    """
+    Maps (Zobrist hash, limit) to the engine score in centipawns from
+    white's point of view. Several processes may share one database file.
+    """
+
+    def __init__(self, path, limit_key):
+        self.path = path
+        self.limit_key = limit_key
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS scores (key INTEGER, limit_key TEXT, score REAL, PRIMARY KEY (key, limit_key))")
+        self.db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def position_key(board):
+        # sqlite integers are signed 64-bit
+        key = chess.polyglot.zobrist_hash(board)
+        return key - (1 << 64) if key >= (1 << 63) else key
+
+    def get(self, board):
+        row = self.db.execute("SELECT score FROM scores WHERE key = ? AND limit_key = ?",
+                              (self.position_key(board), self.limit_key)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, board, score):
+        self.db.execute("INSERT OR REPLACE INTO scores VALUES (?, ?, ?)",
+                        (self.position_key(board), self.limit_key, score))
+        self.db.commit()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+    def close(self):
+        self.db.close()
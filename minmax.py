@@ -0,0 +1,772 @@
+"""
+MinMax search engine with alpha-beta pruning.
+
+Holds the search and evaluation only, with no graphics, so it can be
+imported by benchmarks, worker processes and the UCI front-end without
+opening a window.
+"""
+import chess
+import chess.polyglot
+import multiprocessing
+import threading
+import time
+from array import array
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait
+
+piece_value_dict = {
+    'P' : 1,
+    'R' : 5,
+    'N' : 3,
+    'B' : 3,
+    'Q' : 9,
+    'K' : 100,
+}
+
+# piece_value_dict indexed by chess.PAWN ... chess.KING
+piece_type_values = [0] + [piece_value_dict[chess.piece_symbol(t).upper()] for t in chess.PIECE_TYPES]
+
+# Score of a checkmate, in pawns from white's point of view. A mate found ply
+# plies from the root scores +-(MATE - ply), so nearer mates score higher and
+# the distance can be read back from the score; any score beyond MATE_BOUND
+# is a mate.
+MATE = 1000
+MATE_BOUND = MATE - 256
+
+def mate_score(white_wins, ply):
+    return MATE - ply if white_wins else ply - MATE
+
+def is_mate(score):
+    return abs(score) > MATE_BOUND
+
+def mate_plies(score):
+    # Plies from the root to the mate for a score where is_mate holds
+    return MATE - abs(score)
+
+def score_to_tt(score, ply):
+    # The table keeps mate scores relative to the node, so they stay correct
+    # when the same position is reached at another ply
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+def score_from_tt(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+TTEntry = namedtuple('TTEntry', ['key', 'depth', 'score', 'flag', 'move'])
+
+class TranspositionTable():
+    """
+    Fixed-size hash table of searched positions keyed by Zobrist hash.
+
+    Every bucket has two slots: a depth-preferred slot that only gets replaced
+    by an equal or deeper search, and an always-replace slot that takes
+    everything else. Slots are packed into preallocated arrays, one per field,
+    so the table takes size_mb of memory whatever it holds; probe() builds a
+    TTEntry only for a hit.
+    """
+
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+
+    # Array type codes of the key, score, depth, flag and move of a slot.
+    # Depth -1 marks an empty slot, and a move is packed as
+    # from_square | to_square << 6 | promotion << 12 with NO_MOVE for None.
+    FIELD_TYPES = ('Q', 'd', 'b', 'b', 'H')
+    ENTRY_BYTES = sum(array(t).itemsize for t in FIELD_TYPES)
+    NO_MOVE = 0xFFFF
+
+    def __init__(self, size_mb=16):
+        self.size_mb = size_mb
+        self.bucket_count = max(1, int(size_mb * 1024 * 1024) // (2 * self.ENTRY_BYTES))
+        self.clear()
+
+    def clear(self):
+        # Slot 2*i is the depth-preferred slot of bucket i, 2*i + 1 the always-replace slot
+        slots = 2 * self.bucket_count
+        self.keys = array('Q', [0]) * slots
+        self.scores = array('d', [0.0]) * slots
+        self.depths = array('b', [-1]) * slots
+        self.flags = array('b', [0]) * slots
+        self.moves = array('H', [self.NO_MOVE]) * slots
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def probe(self, key):
+        self.probes += 1
+        slot = 2 * (key % self.bucket_count)
+        if self.keys[slot] != key or self.depths[slot] < 0:
+            slot += 1
+            if self.keys[slot] != key or self.depths[slot] < 0:
+                return None
+        self.hits += 1
+        packed = self.moves[slot]
+        move = None
+        if packed != self.NO_MOVE:
+            move = chess.Move(packed & 63, (packed >> 6) & 63, (packed >> 12) or None)
+        return TTEntry(key, self.depths[slot], self.scores[slot], self.flags[slot], move)
+
+    def store(self, key, depth, score, flag, move):
+        self.stores += 1
+        slot = 2 * (key % self.bucket_count)
+        stored_depth = self.depths[slot]
+        if stored_depth >= 0 and self.keys[slot] != key and depth < stored_depth:
+            slot += 1
+            stored_depth = self.depths[slot]
+        if stored_depth >= 0 and self.keys[slot] != key:
+            self.overwrites += 1
+        self.keys[slot] = key
+        self.scores[slot] = score
+        self.depths[slot] = depth
+        self.flags[slot] = flag
+        if move is None:
+            self.moves[slot] = self.NO_MOVE
+        else:
+            self.moves[slot] = move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+    def hit_rate(self):
+        if self.probes == 0:
+            return 0.0
+        return self.hits / self.probes
+
+    def stats(self):
+        used = len(self.depths) - self.depths.count(-1)
+        return {
+            'size_mb': self.size_mb,
+            'capacity': 2 * self.bucket_count,
+            'used': used,
+            'probes': self.probes,
+            'hits': self.hits,
+            'hit_rate': self.hit_rate(),
+            'stores': self.stores,
+            'overwrites': self.overwrites,
+        }
+
+class SearchTimeout(Exception):
+    pass
+
+class MinMax():
+
+    # Largest swing a single capture is assumed to be able to make beyond the
+    # captured piece itself, used for delta pruning in quiescence search
+    DELTA_MARGIN = 2
+
+    # Nodes searched between looks at the clock and the stop event
+    CHECK_INTERVAL = 256
+
+    # Seconds between looks at the clock and the stop event while the workers search
+    POLL_INTERVAL = 0.01
+
+    def __init__(self, tt_size_mb=16, move_ordering=True, q_depth=8, q_checks=False, workers=1, evaluator=None):
+        # tt_size_mb=0 disables the transposition table, q_depth=0 disables quiescence search.
+        # evaluator is a neural_eval.BatchEvaluator that replaces the material score at the leaves.
+        # With several workers tt_size_mb is shared out between their tables and this process keeps none.
+        self.evaluator = evaluator
+        self.tt_size_mb = tt_size_mb
+        self.tt = TranspositionTable(tt_size_mb) if tt_size_mb > 0 and workers == 1 else None
+        self.workers = workers
+        self.pools = None
+        self.abort = None
+        self.search_id = 0
+        self.move_ordering = move_ordering
+        self.q_depth = q_depth
+        self.q_checks = q_checks
+        self.nodes = 0
+        self.q_nodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.start_time = 0
+        self.killers = []
+        self.history = [0] * (64 * 64)
+        self.material = []
+        self.deadline = None
+        self.stop = None
+        # Guards the deadline against ponderhit, which comes from another thread
+        self.time_lock = threading.Lock()
+        self.searching = False
+        self.pondering = False
+        self.ponder_limit = None
+        self.next_check = self.CHECK_INTERVAL
+        self.completed_depth = 0
+        self.best_score = None
+        self.pv = []
+
+    def evaluation_function(self, board):
+        s = 0
+        for piece_type in chess.PIECE_TYPES:
+            white = chess.popcount(board.pieces_mask(piece_type, chess.WHITE))
+            black = chess.popcount(board.pieces_mask(piece_type, chess.BLACK))
+            s += piece_type_values[piece_type] * (white - black)
+        return s
+
+    def make_move(self, board, move):
+        """
+        Pushes move and updates the material score incrementally, so leaves
+        can be evaluated without rescanning the board.
+        """
+        delta = 0
+        if board.is_capture(move):
+            if board.is_en_passant(move):
+                delta += piece_type_values[chess.PAWN]
+            else:
+                delta += piece_type_values[board.piece_type_at(move.to_square)]
+        if move.promotion is not None:
+            delta += piece_type_values[move.promotion] - piece_type_values[chess.PAWN]
+        if board.turn == chess.BLACK:
+            delta = -delta
+        self.material.append(self.material[-1] + delta)
+        board.push(move)
+
+    def unmake_move(self, board):
+        board.pop()
+        self.material.pop()
+
+    def stats(self):
+        elapsed = time.time() - self.start_time
+        s = {
+            'nodes': self.nodes,
+            'q_nodes': self.q_nodes,
+            'depth': self.completed_depth,
+            'time': elapsed,
+            'nps': (self.nodes + self.q_nodes) / elapsed if elapsed > 0 else 0,
+            'cutoffs': self.cutoffs,
+            'first_move_cutoff_rate': self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0,
+        }
+        if self.tt is not None:
+            s['tt'] = self.tt.stats()
+        if self.evaluator is not None:
+            s['eval'] = self.evaluator.stats()
+        return s
+
+    def reset_search(self):
+        self.nodes = 0
+        self.q_nodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.start_time = time.time()
+        self.next_check = self.CHECK_INTERVAL
+        self.killers = []
+        self.history = [0] * (64 * 64)
+        self.completed_depth = 0
+        self.best_score = None
+        self.pv = []
+        if self.tt is not None:
+            self.tt.reset_stats()
+        if self.evaluator is not None:
+            self.evaluator.reset_stats()
+
+    def run_minmax(self, depth, board, is_maximizing_player):
+        self.reset_search()
+        self.deadline = None
+        root_moves = self.order_moves(board, list(board.legal_moves), 0, None)
+        final_move, self.best_score = self.search_root(depth, board, is_maximizing_player, root_moves)
+        self.completed_depth = depth
+        self.pv = self.principal_variation(board, final_move, depth)
+        return final_move
+
+    def run_minmax_parallel(self, depth, board, is_maximizing_player):
+        """
+        Searches to depth (at least 1) on the worker processes, see
+        search_root_parallel.
+        """
+        return self.run_iterative_deepening(board, None, depth, parallel=True)
+
+    def start_workers(self):
+        if self.pools is None:
+            # Set by the master to make the workers drop the search they are running
+            self.abort = multiprocessing.Event()
+            # One process per executor, so a task always runs on the worker it was sent to
+            self.pools = [ProcessPoolExecutor(max_workers=1, initializer=_init_worker,
+                                              initargs=(self.tt_size_mb / self.workers, self.move_ordering, self.q_depth, self.q_checks, self.abort))
+                          for _ in range(self.workers)]
+        self.abort.clear()
+        self.search_id += 1
+
+    def search_root_parallel(self, depth, board, is_maximizing_player, root_moves, owner):
+        """
+        Splits the root moves across self.workers processes. The first root
+        move is searched with a full window and its score is the bound for
+        all the others. Every root move belongs to one worker for the whole
+        search, and each worker searches its moves in order with a table it
+        keeps across the depths, so deeper iterations reuse the moves and
+        bounds of shallower ones while the result does not depend on how the
+        processes are scheduled.
+        """
+        first = root_moves[0]
+        task = (board, [first], depth, is_maximizing_player, -10000, 10000, self.search_id)
+        [(final_move, best, pv, nodes, q_nodes)] = self.wait_for_workers([self.pools[owner[first]].submit(_search_root_moves, task)])
+        self.nodes += nodes
+        self.q_nodes += q_nodes
+
+        if is_maximizing_player:
+            alpha, beta = best, 10000
+        else:
+            alpha, beta = -10000, best
+        futures = []
+        for worker, pool in enumerate(self.pools):
+            moves = [move for move in root_moves[1:] if owner[move] == worker]
+            if moves:
+                futures.append(pool.submit(_search_root_moves, (board, moves, depth, is_maximizing_player, alpha, beta, self.search_id)))
+        # Results are taken in worker order, so ties go the same way every run
+        for move, val, move_pv, nodes, q_nodes in self.wait_for_workers(futures):
+            self.nodes += nodes
+            self.q_nodes += q_nodes
+            if (is_maximizing_player and val > best) or (not is_maximizing_player and val < best):
+                best = val
+                final_move = move
+                pv = move_pv
+        return final_move, best, pv
+
+    def wait_for_workers(self, futures):
+        """
+        Returns the results of futures, watching the deadline and the stop
+        event meanwhile. When either fires the tasks not yet started are
+        cancelled, the running ones are told to abort, and SearchTimeout is
+        raised once they have.
+        """
+        while True:
+            _, pending = wait(futures, timeout=self.POLL_INTERVAL)
+            if not pending:
+                return [future.result() for future in futures]
+            if (self.deadline is not None and time.time() > self.deadline) or (self.stop is not None and self.stop.is_set()):
+                for future in pending:
+                    future.cancel()
+                self.abort.set()
+                wait(futures)
+                raise SearchTimeout()
+
+    def close(self):
+        if self.pools is not None:
+            for pool in self.pools:
+                pool.shutdown()
+            self.pools = None
+            self.abort = None
+
+    def run_iterative_deepening(self, board, time_limit, max_depth=64, stop=None, on_iteration=None, parallel=None):
+        """
+        Searches depth 1, 2, 3... up to max_depth (at least 1) until
+        time_limit seconds have passed and returns the best move of the last
+        iteration that completed. The best move of each iteration is searched
+        first in the next one. stop is an optional threading.Event that ends
+        the search early when set from another thread; with time_limit=None
+        the search only ends on stop or at max_depth. best_score,
+        completed_depth and pv are updated after each iteration so another
+        thread can show the progress, and on_iteration is called once they
+        are. parallel runs the search on the worker processes, and defaults
+        to doing so when there is more than one.
+        """
+        if parallel is None:
+            parallel = self.workers > 1
+        with self.time_lock:
+            self.reset_search()
+            self.searching = True
+            # A ponderhit may have come in before the search started
+            if time_limit is None:
+                time_limit = self.ponder_limit
+            self.deadline = self.start_time + time_limit if time_limit is not None else None
+        self.stop = stop
+        is_maximizing_player = board.turn == chess.WHITE
+        stack_size = len(board.move_stack)
+
+        try:
+            root_moves = self.order_moves(board, list(board.legal_moves), 0, None)
+            if not root_moves:
+                return None
+            final_move = root_moves[0]
+            if parallel:
+                self.start_workers()
+                owner = {move: i % self.workers for i, move in enumerate(root_moves)}
+            for depth in range(1, max(1, max_depth) + 1):
+                if stop is not None and stop.is_set():
+                    break
+                if parallel:
+                    move, score, pv = self.search_root_parallel(depth, board, is_maximizing_player, root_moves, owner)
+                else:
+                    move, score = self.search_root(depth, board, is_maximizing_player, root_moves)
+                    pv = self.principal_variation(board, move, depth)
+                final_move = move
+                self.best_score = score
+                self.completed_depth = depth
+                self.pv = pv
+                if on_iteration is not None:
+                    on_iteration()
+                root_moves.remove(move)
+                root_moves.insert(0, move)
+                # A mate within the depth searched cannot be improved on by searching deeper
+                if is_mate(score) and mate_plies(score) <= depth:
+                    break
+        except SearchTimeout:
+            while len(board.move_stack) > stack_size:
+                self.unmake_move(board)
+        finally:
+            with self.time_lock:
+                self.deadline = None
+                self.stop = None
+                self.searching = False
+                self.pondering = False
+                self.ponder_limit = None
+
+        return final_move
+
+    def start_ponder(self):
+        """
+        Arms ponderhit for the next run_iterative_deepening with
+        time_limit=None. Call it before starting the thread that runs the
+        search, so a ponderhit that arrives before the search begins is kept.
+        """
+        with self.time_lock:
+            self.pondering = True
+            self.ponder_limit = None
+
+    def ponderhit(self, time_limit):
+        """
+        Turns the ponder search armed by start_ponder into a timed search
+        that ends time_limit seconds after it started, so the time already
+        spent pondering counts for the move. Does nothing once the ponder
+        search has finished.
+        """
+        with self.time_lock:
+            if not self.pondering:
+                return
+            self.ponder_limit = time_limit
+            if self.searching:
+                self.deadline = self.start_time + time_limit
+
+    def search_root(self, depth, board, is_maximizing_player, root_moves):
+        alpha = -10000
+        beta = 10000
+        best = -9000 if is_maximizing_player else 9000
+        final_move = None
+        self.material = [self.evaluation_function(board)]
+        for move in root_moves:
+            self.make_move(board, move)
+            val = self.find_best_move(depth - 1, board, alpha, beta, not is_maximizing_player, 1)
+            self.unmake_move(board)
+            if is_maximizing_player:
+                if val > best or final_move is None:
+                    best = val
+                    final_move = move
+                alpha = max(alpha, best)
+            else:
+                if val < best or final_move is None:
+                    best = val
+                    final_move = move
+                beta = min(beta, best)
+        return final_move, best
+
+    def order_moves(self, board, moves, ply, tt_move):
+        """
+        Sorts moves so that the most promising are searched first: the
+        transposition table move, captures by MVV-LVA, promotions, killer
+        moves, checks, then quiet moves by history score.
+        """
+        if not self.move_ordering:
+            if tt_move in moves:
+                moves.remove(tt_move)
+                moves.insert(0, tt_move)
+            return moves
+
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        scores = {}
+        for move in moves:
+            if move == tt_move:
+                score = 1000000
+            elif board.is_capture(move):
+                score = 100000 + self.mvv_lva(board, move)
+            elif move.promotion is not None:
+                score = 90000 + piece_value_dict[chess.piece_symbol(move.promotion).upper()]
+            elif move in killers:
+                score = 80000
+            elif board.gives_check(move):
+                score = 70000
+            else:
+                score = self.history[move.from_square * 64 + move.to_square]
+            scores[move] = score
+        moves.sort(key=scores.__getitem__, reverse=True)
+        return moves
+
+    def mvv_lva(self, board, move):
+        if board.is_en_passant(move):
+            victim = chess.PAWN
+        else:
+            victim = board.piece_type_at(move.to_square)
+        attacker = board.piece_type_at(move.from_square)
+        return 10 * piece_type_values[victim] - piece_type_values[attacker]
+
+    def record_cutoff(self, board, move, depth, ply, move_index):
+        self.cutoffs += 1
+        if move_index == 0:
+            self.first_move_cutoffs += 1
+        if board.is_capture(move) or move.promotion is not None:
+            return
+        while len(self.killers) <= ply:
+            self.killers.append([None, None])
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[move.from_square * 64 + move.to_square] += depth * depth
+
+    def principal_variation(self, board, first_move, depth):
+        pv = []
+        if first_move is None:
+            return pv
+        pv.append(first_move)
+        board.push(first_move)
+        while self.tt is not None and len(pv) < depth:
+            entry = self.tt.probe(chess.polyglot.zobrist_hash(board))
+            if entry is None or entry.move is None or not board.is_legal(entry.move):
+                break
+            pv.append(entry.move)
+            board.push(entry.move)
+        for _ in pv:
+            board.pop()
+        return pv
+
+    def check_time(self):
+        # Counting up to next_check rather than testing for a multiple of
+        # CHECK_INTERVAL keeps the check firing when nodes grow by more than one
+        if self.nodes + self.q_nodes >= self.next_check:
+            self.next_check = self.nodes + self.q_nodes + self.CHECK_INTERVAL
+            if self.deadline is not None and time.time() > self.deadline:
+                raise SearchTimeout()
+            if self.stop is not None and self.stop.is_set():
+                raise SearchTimeout()
+
+    def quiescence(self, board, alpha, beta, is_maximizing_player, q_ply, ply):
+        """
+        Extends the search at the horizon with captures and promotions
+        (plus checks on the first ply when q_checks is set) until the position
+        is quiet or q_depth plies have been searched. When not in check the
+        side to move may stand pat on the static score, and captures that
+        cannot raise it past the window by DELTA_MARGIN are skipped.
+        """
+        self.q_nodes += 1
+        self.check_time()
+
+        stand_pat = self.material[-1]
+        if q_ply >= self.q_depth:
+            return stand_pat
+
+        in_check = board.is_check()
+        if in_check:
+            moves = list(board.legal_moves)
+            if not moves:
+                return mate_score(board.turn == chess.BLACK, ply)
+            best = -float('inf') if is_maximizing_player else float('inf')
+        else:
+            if is_maximizing_player:
+                if stand_pat >= beta:
+                    return stand_pat
+                alpha = max(alpha, stand_pat)
+            else:
+                if stand_pat <= alpha:
+                    return stand_pat
+                beta = min(beta, stand_pat)
+            best = stand_pat
+            moves = [move for move in board.generate_legal_moves()
+                     if move.promotion is not None or board.is_capture(move)
+                     or (self.q_checks and q_ply == 0 and board.gives_check(move))]
+
+        scores = {}
+        for move in moves:
+            gain = 0
+            if board.is_capture(move):
+                gain += piece_type_values[chess.PAWN] if board.is_en_passant(move) else piece_type_values[board.piece_type_at(move.to_square)]
+            if move.promotion is not None:
+                gain += piece_type_values[move.promotion] - piece_type_values[chess.PAWN]
+            scores[move] = gain
+        moves.sort(key=lambda move: (scores[move], self.mvv_lva(board, move) if board.is_capture(move) else 0), reverse=True)
+
+        for move in moves:
+            if not in_check and scores[move] > 0:
+                if is_maximizing_player and stand_pat + scores[move] + self.DELTA_MARGIN <= alpha:
+                    continue
+                if not is_maximizing_player and stand_pat - scores[move] - self.DELTA_MARGIN >= beta:
+                    continue
+            self.make_move(board, move)
+            val = self.quiescence(board, alpha, beta, not is_maximizing_player, q_ply + 1, ply + 1)
+            self.unmake_move(board)
+            if is_maximizing_player:
+                best = max(best, val)
+                alpha = max(alpha, best)
+            else:
+                best = min(best, val)
+                beta = min(beta, best)
+            if beta <= alpha:
+                break
+        return best
+
+    def evaluate_frontier(self, board, moves, is_maximizing_player, ply):
+        """
+        Scores every child of a depth 1 node with one batched network call
+        instead of visiting the leaves one at a time. This gives up the
+        alpha-beta cutoffs on the last ply in exchange for paying the network
+        overhead once per batch.
+        """
+        scores = [None] * len(moves)
+        pending = []
+        boards = []
+        for i, move in enumerate(moves):
+            board.push(move)
+            self.nodes += 1
+            res = board.result()
+            if res == '1-0':
+                scores[i] = mate_score(True, ply + 1)
+            elif res == '0-1':
+                scores[i] = mate_score(False, ply + 1)
+            elif res == '1/2-1/2':
+                scores[i] = 0
+            else:
+                pending.append(i)
+                boards.append(board.copy(stack=False))
+            board.pop()
+        self.check_time()
+
+        for i, score in zip(pending, self.evaluator.evaluate(boards)):
+            scores[i] = score
+
+        best = None
+        best_move = None
+        for move, score in zip(moves, scores):
+            if best is None or (is_maximizing_player and score > best) or (not is_maximizing_player and score < best):
+                best = score
+                best_move = move
+        return best, best_move
+
+    def find_best_move(self, depth, board, alpha, beta, is_maximizing_player, ply=1):
+        # return choice(get_all_legal_moves_for_side(-1, curr_state.board))
+        self.nodes += 1
+        self.check_time()
+
+        res = board.result()
+        if res == '1-0': 
+            return mate_score(True, ply)
+        elif res == '0-1': 
+            return mate_score(False, ply)
+        elif res == '1/2-1/2':
+            return 0
+
+        if depth == 0:
+            if self.evaluator is not None:
+                return self.evaluator.evaluate([board])[0]
+            if self.q_depth > 0:
+                return self.quiescence(board, alpha, beta, is_maximizing_player, 0, ply)
+            return self.material[-1]
+
+        key = None
+        tt_move = None
+        if self.tt is not None:
+            key = chess.polyglot.zobrist_hash(board)
+            entry = self.tt.probe(key)
+            if entry is not None:
+                tt_move = entry.move
+                if entry.depth >= depth:
+                    score = score_from_tt(entry.score, ply)
+                    if entry.flag == TranspositionTable.EXACT:
+                        return score
+                    elif entry.flag == TranspositionTable.LOWER:
+                        alpha = max(alpha, score)
+                    elif entry.flag == TranspositionTable.UPPER:
+                        beta = min(beta, score)
+                    if beta <= alpha:
+                        return score
+
+        alpha_orig = alpha
+        beta_orig = beta
+        list_of_legal_moves = self.order_moves(board, list(board.legal_moves), ply, tt_move)
+
+        best_move = None
+        if depth == 1 and self.evaluator is not None:
+            best, best_move = self.evaluate_frontier(board, list_of_legal_moves, is_maximizing_player, ply)
+        elif (is_maximizing_player):
+            best = -float('inf')
+            for i, move in enumerate(list_of_legal_moves):
+                self.make_move(board, move)
+                val = self.find_best_move(depth - 1, board, alpha, beta, not is_maximizing_player, ply + 1)
+                self.unmake_move(board)
+                if val > best or best_move is None:
+                    best = val
+                    best_move = move
+                alpha = max(alpha, best)
+                if beta <= alpha:
+                    self.record_cutoff(board, move, depth, ply, i)
+                    break
+        else:
+            best = float('inf')
+            for i, move in enumerate(list_of_legal_moves):
+                self.make_move(board, move)
+                val = self.find_best_move(depth - 1, board, alpha, beta, not is_maximizing_player, ply + 1)
+                self.unmake_move(board)
+                if val < best or best_move is None:
+                    best = val
+                    best_move = move
+                beta = min(beta, best)
+                if beta <= alpha:
+                    self.record_cutoff(board, move, depth, ply, i)
+                    break
+
+        if self.tt is not None:
+            if best <= alpha_orig:
+                flag = TranspositionTable.UPPER
+            elif best >= beta_orig:
+                flag = TranspositionTable.LOWER
+            else:
+                flag = TranspositionTable.EXACT
+            self.tt.store(key, depth, score_to_tt(best, ply), flag, best_move)
+        return best
+
+_worker_mm = None
+# search_id of the parallel search the worker's table belongs to
+_worker_search_id = None
+
+def _init_worker(tt_size_mb, move_ordering, q_depth, q_checks, abort):
+    global _worker_mm
+    _worker_mm = MinMax(tt_size_mb=tt_size_mb, move_ordering=move_ordering, q_depth=q_depth, q_checks=q_checks)
+    # check_time raises SearchTimeout once the master sets abort
+    _worker_mm.stop = abort
+
+def _search_root_moves(task):
+    # Searches this worker's share of the root moves in order, narrowing the
+    # window as it goes, and returns the best of them
+    global _worker_search_id
+    board, moves, depth, is_maximizing_player, alpha, beta, search_id = task
+    mm = _worker_mm
+    mm.reset_search()
+    if mm.tt is not None and search_id != _worker_search_id:
+        mm.tt.clear()
+    _worker_search_id = search_id
+    mm.material = [mm.evaluation_function(board)]
+    best = None
+    best_move = None
+    pv = []
+    try:
+        for move in moves:
+            mm.make_move(board, move)
+            val = mm.find_best_move(depth - 1, board, alpha, beta, not is_maximizing_player, 1)
+            mm.unmake_move(board)
+            if (best_move is None or (is_maximizing_player and val > best)
+                    or (not is_maximizing_player and val < best)):
+                best = val
+                best_move = move
+                pv = mm.principal_variation(board, move, depth)
+            if is_maximizing_player:
+                alpha = max(alpha, val)
+            else:
+                beta = min(beta, val)
+    except SearchTimeout:
+        # The master has stopped waiting for this result
+        return None
+    return best_move, best, pv, mm.nodes, mm.q_nodes
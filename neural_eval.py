@@ -0,0 +1,76 @@
+"""
+Batched neural network evaluation for the MinMax search.
+
+The MLP is trained on sigmoid(centipawns) labels from create_data.py, so its
+output is converted back to pawn units to be comparable with the material
+evaluation. Positions are encoded with encoding.encode_boards and evaluated
+in batches, so the per-call overhead of the network is paid once per batch
+rather than once per leaf.
+"""
+import math
+import time
+
+import numpy as np
+
+from encoding import encode_boards
+
+def score_from_output(p):
+    # Inverse of create_data.sigmoid, in pawns from white's point of view
+    p = min(max(float(p), 1e-7), 1 - 1e-7)
+    return math.log(p / (1 - p)) / 100.0
+
+def load_predict(path):
+    """
+    Returns a predict function for a network saved at path: an exported
+    .npz file runs on NumpyMLP, anything else is loaded with Keras.
+    """
+    if path.endswith('.npz'):
+        from numpy_mlp import NumpyMLP
+        return NumpyMLP.load(path).predict
+    from keras.models import load_model
+    model = load_model(path)
+    return model.predict_on_batch
+
+class BatchEvaluator():
+    """
+    Evaluates boards with predict, a function mapping an (N, 768) float32
+    array to N network outputs.
+
+    evaluate() runs a list of boards in chunks of batch_size. The search
+    calls it once per depth 1 node with all of that node's children.
+    """
+
+    def __init__(self, predict, batch_size=256):
+        self.predict = predict
+        self.batch_size = batch_size
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.positions = 0
+        self.batches = 0
+        self.eval_time = 0
+
+    def stats(self):
+        return {
+            'positions': self.positions,
+            'batches': self.batches,
+            'avg_batch': self.positions / self.batches if self.batches else 0,
+            'eval_time': self.eval_time,
+            'positions_per_sec': self.positions / self.eval_time if self.eval_time > 0 else 0,
+        }
+
+    def run_batch(self, boards):
+        start = time.time()
+        X = encode_boards(boards).astype(np.float32)
+        out = np.asarray(self.predict(X), dtype=np.float32).reshape(len(boards))
+        scores = [score_from_output(p) for p in out]
+        self.positions += len(boards)
+        self.batches += 1
+        self.eval_time += time.time() - start
+        return scores
+
+    def evaluate(self, boards):
+        scores = []
+        for i in range(0, len(boards), self.batch_size):
+            scores.extend(self.run_batch(boards[i:i + self.batch_size]))
+        return scores
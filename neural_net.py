@@ -1,20 +1,97 @@
 """
 Neural Net for Chess Heuristic Function.
+
+Trains the evaluation MLP on the dataset made by create_data.py: the
+768-bit board encoding as input and the sigmoid of the Stockfish score as
+target. Weights are checkpointed every epoch and exported to an .npz file
+that the search loads with numpy_mlp, without Keras.
 """
+import glob
+import os
+import time
+from data_loader import DataLoader
+from numpy_mlp import export_keras_weights
+
+def configure_threads(threads):
+    # Has to run before TensorFlow creates its thread pools
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(max(1, threads // 2))
+
+def build_model(hidden=(2048, 2048, 1050), activation='elu', learning_rate=0.001):
+    import keras
+    model = keras.Sequential([keras.Input(shape=(768,))]
+                             + [keras.layers.Dense(units, activation=activation) for units in hidden]
+                             + [keras.layers.Dense(1, activation='sigmoid')])
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate=learning_rate), loss='mse')
+    return model
+
+def latest_checkpoint(checkpoint_dir):
+    checkpoints = glob.glob(os.path.join(checkpoint_dir, 'epoch_*.weights.h5'))
+    if not checkpoints:
+        return None, 0
+    epoch = max(int(os.path.basename(c).split('_')[1].split('.')[0]) for c in checkpoints)
+    return os.path.join(checkpoint_dir, f'epoch_{epoch}.weights.h5'), epoch
+
+def validate(model, loader):
+    total = 0
+    samples = 0
+    for X, y in loader:
+        total += float(model.test_on_batch(X, y)) * len(y)
+        samples += len(y)
+    return total / samples if samples else 0
+
+def train(model, loader, epochs, checkpoint_dir, export_path, validation=None, start_epoch=0, log_every=100):
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    for epoch in range(start_epoch, epochs):
+        epoch_start = time.time()
+        window_start = epoch_start
+        window_samples = 0
+        samples = 0
+        loss = 0
+        for batch, (X, y) in enumerate(loader, 1):
+            loss = float(model.train_on_batch(X, y))
+            samples += len(y)
+            window_samples += len(y)
+            if batch % log_every == 0:
+                now = time.time()
+                print(f"Epoch {epoch+1} batch {batch}/{len(loader)}: loss {loss:.5f}, {window_samples/(now-window_start):.0f} samples/s")
+                window_start = now
+                window_samples = 0
+
+        epoch_time = time.time() - epoch_start
+        message = f"Epoch {epoch+1} done in {epoch_time:.1f}s ({samples/epoch_time:.0f} samples/s), loss {loss:.5f}"
+        if validation is not None:
+            message += f", validation loss {validate(model, validation):.5f}"
+        print(message)
+
+        model.save_weights(os.path.join(checkpoint_dir, f'epoch_{epoch+1}.weights.h5'))
+        export_keras_weights(model, export_path)
+
+def main():
+
+    dataset_paths = ['data']
+    validation_path = None
+    checkpoint_dir = 'checkpoints'
+    export_path = 'model.npz'
+    epochs = 20
+    batch_size = 256
+    threads = os.cpu_count()
+    loader_threads = 2
+
+    configure_threads(threads)
+    loader = DataLoader(dataset_paths, batch_size=batch_size, threads=loader_threads)
+    validation = DataLoader(validation_path, batch_size=4096, threads=loader_threads) if validation_path else None
+    print(f"Training on {loader.samples()} samples, batch size {batch_size}, {threads} threads.")
+
+    model = build_model()
+    checkpoint, start_epoch = latest_checkpoint(checkpoint_dir)
+    if checkpoint is not None:
+        print(f"Resuming from {checkpoint}")
+        model.load_weights(checkpoint)
+
+    train(model, loader, epochs, checkpoint_dir, export_path, validation, start_epoch)
+    print(f"Exported weights to {export_path}")
 
-import chess
-import chess.pgn
-
-pgn = open('datasets/ficsgamesdb_2018_CvC_nomovetimes_51973.pgn')
-curr_parsed_game = chess.pgn.read_game(pgn)
-i = 0
-while curr_parsed_game is not None:
-    curr_parsed_game = chess.pgn.read_game(pgn)
-    i += 1
-print(f"Parsed {i} games.")
-# game2 = chess.pgn.read_game(pgn)
-# board = game2.board()
-# for i in game2.mainline_moves():
-#     board.push(i)
-#     print(board)
-#     print("")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
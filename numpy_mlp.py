@@ -0,0 +1,80 @@
+"""
+Pure NumPy inference for the evaluation MLP.
+
+Weights of a trained Keras model are exported to a compact .npz file, which
+NumpyMLP evaluates with plain float32 matrix products. This avoids importing
+Keras/TensorFlow in the search process.
+"""
+import numpy as np
+
+activations = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+    'tanh': np.tanh,
+    'elu': lambda x: np.where(x > 0, x, np.expm1(np.minimum(x, 0))),
+}
+
+def quantize(W):
+    # Symmetric per-output-unit int8 quantization
+    scale = np.abs(W).max(axis=0) / 127.0
+    scale[scale == 0] = 1.0
+    return np.round(W / scale).astype(np.int8), scale.astype(np.float32)
+
+def save_weights(path, layers, quantized=False):
+    """
+    Writes layers, a list of (W, b, activation) tuples, to path. With
+    quantized=True the weight matrices are stored as int8 with one float32
+    scale per output unit, a quarter of the float32 size.
+    """
+    arrays = {'activations': np.array([a for _, _, a in layers])}
+    for i, (W, b, activation) in enumerate(layers):
+        if activation not in activations:
+            raise ValueError(f"Unsupported activation: {activation}")
+        if quantized:
+            arrays[f'W{i}'], arrays[f'scale{i}'] = quantize(np.asarray(W, dtype=np.float32))
+        else:
+            arrays[f'W{i}'] = np.asarray(W, dtype=np.float32)
+        arrays[f'b{i}'] = np.asarray(b, dtype=np.float32)
+    np.savez(path, **arrays)
+
+def export_keras_weights(model, path, quantized=False):
+    layers = []
+    for layer in model.layers:
+        weights = layer.get_weights()
+        if not weights:
+            continue
+        if len(weights) != 2:
+            raise ValueError(f"Only Dense layers can be exported, got {layer.name}")
+        layers.append((weights[0], weights[1], layer.get_config()['activation']))
+    save_weights(path, layers, quantized)
+
+class NumpyMLP():
+
+    def __init__(self, layers):
+        self.layers = [(W, b, activations[a]) for W, b, a in layers]
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        layers = []
+        for i, activation in enumerate(data['activations']):
+            W = data[f'W{i}']
+            if W.dtype == np.int8:
+                W = W.astype(np.float32) * data[f'scale{i}']
+            layers.append((W, data[f'b{i}'], str(activation)))
+        return cls(layers)
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        for W, b, activation in self.layers:
+            X = activation(X @ W + b)
+        return X
+
+def max_difference(model, mlp, X):
+    """
+    Largest absolute difference between the outputs of a Keras model and
+    a NumpyMLP on the inputs X.
+    """
+    expected = np.asarray(model.predict_on_batch(X), dtype=np.float32)
+    return float(np.abs(expected - mlp.predict(X)).max())
@@ -0,0 +1,169 @@
+"""
+Byte-level index of the games in a PGN file.
+
+The file is scanned once for the start of every header block, without
+parsing any moves, and the game offsets are saved next to it along with a
+few headers. Later runs load the index instead of rescanning, and can jump
+straight to game n or split the file into shards of whole games.
+"""
+import io
+import mmap
+import os
+import re
+import sys
+import chess.pgn
+import numpy as np
+
+# A header block starts with a tag line at the start of the file (after any
+# byte order mark and blank lines) or after a blank line
+game_start = re.compile(rb'(?:\A(?:\xef\xbb\xbf)?[ \t\r\n]*|\n[ \t\r]*\n)[ \t]*(\[[A-Za-z0-9_]+[ \t]+")')
+blank_line = re.compile(rb'\n[ \t\r]*\n')
+header_tag = re.compile(rb'\[(Result|WhiteElo|BlackElo) "([^"]*)"\]')
+
+result_codes = {b'1-0': 1, b'0-1': -1, b'1/2-1/2': 0}
+UNKNOWN_RESULT = -128
+
+def index_path(pgn_path):
+    return pgn_path + '.idx.npz'
+
+def find_games(data, size):
+    """
+    Offsets of the header blocks in data, leaving out tag-like lines that sit
+    inside a {...} comment.
+    """
+    offsets = []
+    # Everything before pos has been checked and pos is outside any comment
+    pos = 0
+    for m in game_start.finditer(data):
+        start = m.start(1)
+        if start < pos:
+            continue
+        closed = pos
+        while True:
+            opened = data.find(b'{', closed, start)
+            if opened == -1:
+                break
+            closed = data.find(b'}', opened)
+            if closed == -1 or closed > start:
+                break
+            closed += 1
+        if opened != -1:
+            # start is inside a comment; resume after it ends
+            pos = size if closed == -1 else closed + 1
+            continue
+        offsets.append(start)
+        # Header values are not comments, so braces in them are skipped
+        end = blank_line.search(data, start)
+        pos = start if end is None else end.start()
+    return offsets
+
+def scan(pgn_path):
+    """
+    Returns the byte offsets of all games plus the end of file, and the
+    Result, WhiteElo and BlackElo header of each game.
+    """
+    with open(pgn_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            empty = np.empty(0, dtype=np.int16)
+            return np.zeros(1, dtype=np.uint64), {'result': empty.astype(np.int8), 'white_elo': empty, 'black_elo': empty}
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            offsets = find_games(data, size)
+            results = np.full(len(offsets), UNKNOWN_RESULT, dtype=np.int8)
+            white_elo = np.zeros(len(offsets), dtype=np.int16)
+            black_elo = np.zeros(len(offsets), dtype=np.int16)
+            for i, start in enumerate(offsets):
+                limit = offsets[i + 1] if i + 1 < len(offsets) else size
+                end = data.find(b'\n\n', start, limit)
+                for m in header_tag.finditer(data, start, end if end != -1 else limit):
+                    tag, value = m.group(1), m.group(2)
+                    if tag == b'Result':
+                        results[i] = result_codes.get(value, UNKNOWN_RESULT)
+                    elif value.isdigit():
+                        if tag == b'WhiteElo':
+                            white_elo[i] = min(int(value), 32767)
+                        else:
+                            black_elo[i] = min(int(value), 32767)
+        finally:
+            data.close()
+    offsets.append(size)
+    return np.array(offsets, dtype=np.uint64), {'result': results, 'white_elo': white_elo, 'black_elo': black_elo}
+
+class PGNIndex():
+    """
+    Offsets of the games in a PGN file. len(index) is the number of games,
+    index.game(n) parses game n, and index.shards(k) splits the games into k
+    contiguous byte ranges.
+    """
+
+    def __init__(self, pgn_path, offsets, headers):
+        self.pgn_path = pgn_path
+        self.offsets = offsets
+        self.headers = headers
+
+    @classmethod
+    def load(cls, pgn_path, rebuild=False):
+        """
+        Loads the index saved next to pgn_path, scanning the file first if
+        there is none or the PGN changed since it was built.
+        """
+        stat = os.stat(pgn_path)
+        path = index_path(pgn_path)
+        if not rebuild and os.path.exists(path):
+            data = np.load(path)
+            if int(data['size']) == stat.st_size and int(data['mtime_ns']) == stat.st_mtime_ns:
+                return cls(pgn_path, data['offsets'], {k: data[k] for k in ('result', 'white_elo', 'black_elo')})
+        offsets, headers = scan(pgn_path)
+        with open(path, 'wb') as f:
+            np.savez(f, offsets=offsets, size=stat.st_size, mtime_ns=stat.st_mtime_ns, **headers)
+        return cls(pgn_path, offsets, headers)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def byte_range(self, start, stop=None):
+        # Byte range covering games start to stop-1
+        stop = len(self) if stop is None else stop
+        return int(self.offsets[start]), int(self.offsets[stop])
+
+    def read_text(self, start, stop=None):
+        begin, end = self.byte_range(start, stop)
+        with open(self.pgn_path, 'rb') as f:
+            f.seek(begin)
+            return f.read(end - begin).decode('utf-8', errors='replace')
+
+    def game(self, n):
+        if n < 0:
+            n += len(self)
+        if not 0 <= n < len(self):
+            raise IndexError(f"Game {n} out of range for {len(self)} games")
+        return chess.pgn.read_game(io.StringIO(self.read_text(n, n + 1)))
+
+    def games(self, start=0, stop=None):
+        # Parses games start to stop-1 in order
+        handle = io.StringIO(self.read_text(start, stop))
+        for _ in range(start, len(self) if stop is None else stop):
+            yield chess.pgn.read_game(handle)
+
+    def shards(self, count, start=0, stop=None):
+        """
+        Splits games start to stop-1 (all games by default) into at most
+        count contiguous shards of roughly equal byte size, returned as
+        (start game, stop game) pairs.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        if start >= stop:
+            return []
+        targets = np.linspace(int(self.offsets[start]), int(self.offsets[stop]), count + 1)
+        bounds = start + np.searchsorted(self.offsets[start:stop], targets[1:-1].astype(np.uint64))
+        bounds = [start] + sorted(set(int(b) for b in bounds) - {start, stop}) + [stop]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+def main():
+    pgn_path = sys.argv[1] if len(sys.argv) > 1 else 'datasets/ficsgamesdb_2018_CvC_nomovetimes_51973.pgn'
+    index = PGNIndex.load(pgn_path)
+    print(f"Indexed {len(index)} games in {pgn_path}.")
+
+if __name__ == "__main__":
+    main()
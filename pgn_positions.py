@@ -0,0 +1,94 @@
+"""
+Multi-process position extraction from a PGN file.
+
+The file is split into shards of whole games using pgn_index, the shards
+are parsed in a process pool, and the positions of each game are streamed
+back in game order. Parsing uses a visitor that keeps only the mainline
+positions, so no game tree is built and headers, comments and side
+variations are skipped.
+"""
+import io
+import multiprocessing
+import os
+import chess.pgn
+import numpy as np
+from encoding import encode_board
+from pgn_index import PGNIndex
+
+class PositionVisitor(chess.pgn.BaseVisitor):
+    """
+    Collects the position before each mainline move, up to state_limit
+    positions per game, as FEN strings or as packed encode_board bits.
+    """
+
+    def __init__(self, state_limit=None, packed=False):
+        self.state_limit = state_limit
+        self.packed = packed
+        self.positions = []
+
+    def begin_game(self):
+        self.positions = []
+
+    def begin_variation(self):
+        return chess.pgn.SKIP
+
+    def visit_move(self, board, move):
+        if self.state_limit is None or len(self.positions) < self.state_limit:
+            if self.packed:
+                self.positions.append(np.packbits(encode_board(board)))
+            else:
+                self.positions.append(board.fen())
+
+    def handle_error(self, error):
+        pass
+
+    def result(self):
+        if self.packed:
+            return np.array(self.positions, dtype=np.uint8).reshape(-1, 96)
+        return self.positions
+
+def parse_shard(task):
+    """
+    Parses games start to stop-1 of the PGN and returns a list of
+    (game index, positions) pairs.
+    """
+    pgn_path, start, stop, state_limit, packed = task
+    index = PGNIndex.load(pgn_path)
+    handle = io.StringIO(index.read_text(start, stop))
+    visitor = lambda: PositionVisitor(state_limit, packed)
+    games = []
+    for i in range(start, stop):
+        positions = chess.pgn.read_game(handle, Visitor=visitor)
+        if positions is None:
+            break
+        games.append((i, positions))
+    return games
+
+def extract_positions(pgn_path, start_game=0, stop_game=None, state_limit=None, packed=False, workers=None, shards_per_worker=8):
+    """
+    Yields (game index, positions) for games start_game to stop_game-1 in
+    order, parsing the file in workers processes. Positions are a list of
+    FENs, or an (N, 96) uint8 array of packed encodings with packed=True.
+    """
+    index = PGNIndex.load(pgn_path)
+    stop_game = len(index) if stop_game is None else min(stop_game, len(index))
+    if start_game >= stop_game:
+        return
+    workers = workers or os.cpu_count()
+
+    # Shards hold about the same number of bytes rather than of games, so
+    # long games do not leave one worker with most of the parsing
+    shards = index.shards(workers * shards_per_worker, start_game, stop_game)
+    tasks = [(pgn_path, start, stop, state_limit, packed) for start, stop in shards]
+
+    with multiprocessing.Pool(workers) as pool:
+        for games in pool.imap(parse_shard, tasks):
+            yield from games
+
+def stream_positions(pgn_path, stop_game=None, state_limit=None, start_game=0, workers=None):
+    """
+    Flattens extract_positions into ((game index, state index), fen) pairs.
+    """
+    for game_index, fens in extract_positions(pgn_path, start_game, stop_game, state_limit, workers=workers):
+        for state_index, fen in enumerate(fens):
+            yield (game_index, state_index), fen
@@ -0,0 +1,193 @@
+"""
+Deduplication and sampling of positions before labeling.
+
+Positions from stream_positions are grouped by game. Positions already
+seen in earlier games are dropped, using a Bloom filter over their Zobrist
+hashes so memory stays bounded. Each game can also be limited to a random
+sample of positions per game phase, so openings do not dominate the
+dataset.
+"""
+import math
+import os
+import random
+import threading
+import chess
+import chess.polyglot
+import numpy as np
+
+PHASES = ('opening', 'middlegame', 'endgame')
+
+# Non-pawn material of both sides at the start is 62
+phase_values = {chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9}
+
+def new_counts():
+    return {phase: {'positions': 0, 'duplicates': 0, 'kept': 0} for phase in PHASES}
+
+def add_counts(total, counts):
+    for phase in PHASES:
+        for k, v in counts[phase].items():
+            total[phase][k] += v
+
+def game_phase(board, opening_plies=20, endgame_material=26):
+    ply = 2 * (board.fullmove_number - 1) + (board.turn == chess.BLACK)
+    if ply < opening_plies:
+        return 'opening'
+    material = sum(value * chess.popcount(board.pieces_mask(piece_type, chess.WHITE) | board.pieces_mask(piece_type, chess.BLACK))
+                   for piece_type, value in phase_values.items())
+    if material <= endgame_material:
+        return 'endgame'
+    return 'middlegame'
+
+class BloomFilter():
+    """
+    Set membership for 64-bit keys with no false negatives and about
+    error_rate false positives once capacity keys have been added.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        self.count = 0
+
+    def positions(self, key):
+        # Double hashing from the two halves of the key
+        h1 = key & 0xffffffff
+        h2 = (key >> 32) | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, key):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self.positions(key))
+
+    def add(self, key):
+        for p in self.positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def memory(self):
+        return self.bits.nbytes
+
+class PositionSampler():
+    """
+    Filters a stream of ((game, state), fen) pairs. Positions whose
+    hash is already in the filter are dropped, and with phase_limit set at
+    most phase_limit positions of each phase are kept per game, chosen by
+    reservoir sampling with a per-game seed. Only kept positions are added
+    to the filter.
+
+    filter() usually runs ahead of the labeling, so for checkpoints the keys
+    and counts of each filtered game are held back until commit() is told
+    that the game has been written. save() stores the committed filter and
+    counts, and load() restores them, so a run resumed from the start of a
+    game keeps and drops exactly the positions an uninterrupted run would.
+    """
+
+    def __init__(self, capacity=10000000, error_rate=0.001, phase_limit=None, seed=0):
+        self.seen = BloomFilter(capacity, error_rate)
+        self.committed = BloomFilter(capacity, error_rate)
+        self.phase_limit = phase_limit
+        self.seed = seed
+        self.counts = new_counts()
+        self.committed_counts = new_counts()
+        # game index -> (kept keys, counts) of filtered games not committed yet.
+        # filter() may run on another thread, such as a Pool's task feeder.
+        self.uncommitted = {}
+        self.lock = threading.Lock()
+
+    def sample_game(self, game_index, positions, counts):
+        rng = random.Random(self.seed * 1000003 + game_index)
+        reservoirs = {phase: [] for phase in PHASES}
+        seen_in_phase = {phase: 0 for phase in PHASES}
+        for order, (tag, fen, key, phase) in enumerate(positions):
+            reservoir = reservoirs[phase]
+            seen_in_phase[phase] += 1
+            if self.phase_limit is None or len(reservoir) < self.phase_limit:
+                reservoir.append((order, tag, fen, key))
+            else:
+                j = rng.randrange(seen_in_phase[phase])
+                if j < self.phase_limit:
+                    reservoir[j] = (order, tag, fen, key)
+        kept = sorted(item for phase in PHASES for item in reservoirs[phase])
+        for phase in PHASES:
+            counts[phase]['kept'] += len(reservoirs[phase])
+        return kept
+
+    def filter(self, stream):
+        current_game = None
+        pending = []
+        pending_keys = set()
+        counts = new_counts()
+        for tag, fen in stream:
+            game_index = tag[0]
+            if game_index != current_game:
+                yield from self.flush(current_game, pending, counts)
+                current_game = game_index
+                pending = []
+                pending_keys = set()
+                counts = new_counts()
+            board = chess.Board(fen)
+            key = chess.polyglot.zobrist_hash(board)
+            phase = game_phase(board)
+            counts[phase]['positions'] += 1
+            if key in pending_keys or key in self.seen:
+                counts[phase]['duplicates'] += 1
+                continue
+            pending.append((tag, fen, key, phase))
+            pending_keys.add(key)
+        yield from self.flush(current_game, pending, counts)
+
+    def flush(self, game_index, pending, counts):
+        if game_index is None:
+            return
+        kept = self.sample_game(game_index, pending, counts)
+        for _, _, _, key in kept:
+            self.seen.add(key)
+        with self.lock:
+            add_counts(self.counts, counts)
+            self.uncommitted[game_index] = ([key for _, _, _, key in kept], counts)
+        for _, tag, fen, _ in kept:
+            yield tag, fen
+
+    def commit(self, game_index):
+        """
+        Marks every game before game_index as written.
+        """
+        with self.lock:
+            done = sorted(g for g in self.uncommitted if g < game_index)
+            games = [self.uncommitted.pop(g) for g in done]
+        for keys, counts in games:
+            for key in keys:
+                self.committed.add(key)
+            add_counts(self.committed_counts, counts)
+
+    def save(self, path):
+        # Written to a temporary file first so a crash never leaves half a file
+        counts = np.array([[self.committed_counts[phase][k] for k in ('positions', 'duplicates', 'kept')] for phase in PHASES])
+        np.savez(path + '.tmp.npz', bits=self.committed.bits, count=self.committed.count, counts=counts)
+        os.replace(path + '.tmp.npz', path)
+
+    def load(self, path):
+        """
+        Restores the state saved by save() into a sampler created with the
+        same capacity and error_rate. Call before filter().
+        """
+        with np.load(path) as data:
+            if data['bits'].shape != self.seen.bits.shape:
+                raise ValueError(f"{path} was saved with a different capacity or error rate")
+            counts = {phase: dict(zip(('positions', 'duplicates', 'kept'), map(int, row))) for phase, row in zip(PHASES, data['counts'])}
+            for bloom in (self.seen, self.committed):
+                bloom.bits[:] = data['bits']
+                bloom.count = int(data['count'])
+        self.counts = counts
+        self.committed_counts = {phase: dict(c) for phase, c in counts.items()}
+        self.uncommitted = {}
+
+    def report(self):
+        lines = [f"{'phase':<12}{'positions':>12}{'duplicates':>12}{'kept':>12}"]
+        for phase in PHASES:
+            c = self.counts[phase]
+            lines.append(f"{phase:<12}{c['positions']:>12}{c['duplicates']:>12}{c['kept']:>12}")
+        total = {k: sum(self.counts[p][k] for p in PHASES) for k in ('positions', 'duplicates', 'kept')}
+        lines.append(f"{'total':<12}{total['positions']:>12}{total['duplicates']:>12}{total['kept']:>12}")
+        lines.append(f"Bloom filter: {self.seen.count} keys, {self.seen.memory()/1024/1024:.1f} MB")
+        return '\n'.join(lines)
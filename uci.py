@@ -0,0 +1,230 @@
+"""
+UCI front-end for the MinMax engine.
+
+Reads UCI commands on stdin and answers on stdout, so the engine can be
+loaded into any UCI GUI or match runner:
+
+    python uci.py
+
+Supports uci, isready, setoption (Hash, Threads), ucinewgame, position,
+go (depth, movetime, wtime/btime/winc/binc/movestogo, infinite, ponder),
+stop, ponderhit and quit. With Threads above 1 every search is split
+across that many worker processes.
+"""
+import multiprocessing
+import sys
+import threading
+import chess
+from minmax import MinMax, is_mate, mate_plies
+
+ENGINE_NAME = 'chess_ai MinMax'
+ENGINE_AUTHOR = 'Sharven'
+
+# Seconds kept back from every timed search for the GUI and process overhead
+MOVE_OVERHEAD = 0.05
+
+# Moves the remaining clock is spread over when the GUI does not send movestogo
+DEFAULT_MOVES_TO_GO = 30
+
+def allocate_time(params, turn):
+    """
+    Seconds to spend on a move given the parameters of a go command, or None
+    if the search has no time limit.
+    """
+    if 'movetime' in params:
+        return max(0.01, params['movetime'] / 1000 - MOVE_OVERHEAD)
+    remaining = params.get('wtime' if turn == chess.WHITE else 'btime')
+    if remaining is None:
+        return None
+    increment = params.get('winc' if turn == chess.WHITE else 'binc', 0)
+    moves_to_go = params.get('movestogo', DEFAULT_MOVES_TO_GO)
+    budget = min(remaining / 2, remaining / moves_to_go + increment * 0.8)
+    return max(0.01, budget / 1000 - MOVE_OVERHEAD)
+
+def uci_score(score, turn):
+    # MinMax scores are in pawns from white's point of view, UCI scores are
+    # from the side to move. Mate scores carry the distance to the mate.
+    sign = 1 if turn == chess.WHITE else -1
+    if is_mate(score):
+        moves = (mate_plies(score) + 1) // 2
+        return 'mate %d' % (moves if score * sign > 0 else -moves)
+    return 'cp %d' % round(score * sign * 100)
+
+class UCIEngine():
+    """
+    Keeps the position and options between commands and runs each go on a
+    background thread, so stop, isready and ponderhit are answered while the
+    engine is thinking.
+    """
+
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.out_lock = threading.Lock()
+        self.hash_mb = 16
+        self.threads = 1
+        self.mm = None
+        self.board = chess.Board()
+        self.search_thread = None
+        self.stop_event = threading.Event()
+        # Set by ponderhit or stop; a ponder search holds its bestmove until then
+        self.release = threading.Event()
+        self.ponder_time = None
+
+    def send(self, line):
+        with self.out_lock:
+            self.out.write(line + '\n')
+            self.out.flush()
+
+    def engine(self):
+        if self.mm is None:
+            self.mm = MinMax(tt_size_mb=self.hash_mb, workers=self.threads)
+        return self.mm
+
+    def handle(self, line):
+        """
+        Runs one command. Returns False once quit has been received.
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        command = tokens[0]
+        if command == 'uci':
+            self.send('id name ' + ENGINE_NAME)
+            self.send('id author ' + ENGINE_AUTHOR)
+            self.send('option name Hash type spin default 16 min 1 max 4096')
+            self.send('option name Threads type spin default 1 min 1 max 64')
+            self.send('option name Ponder type check default false')
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'setoption':
+            self.set_option(tokens)
+        elif command == 'ucinewgame':
+            self.stop()
+            if self.mm is not None and self.mm.tt is not None:
+                self.mm.tt.clear()
+            self.board = chess.Board()
+        elif command == 'position':
+            self.stop()
+            self.set_position(tokens)
+        elif command == 'go':
+            self.stop()
+            self.go(tokens)
+        elif command == 'stop':
+            self.stop()
+        elif command == 'ponderhit':
+            self.ponderhit()
+        elif command == 'quit':
+            return False
+        return True
+
+    def set_option(self, tokens):
+        # setoption name <name> value <value>
+        if 'name' not in tokens:
+            return
+        value_index = tokens.index('value') if 'value' in tokens else len(tokens)
+        name = ' '.join(tokens[tokens.index('name') + 1:value_index]).lower()
+        value = ' '.join(tokens[value_index + 1:])
+        self.stop()
+        if name == 'hash':
+            self.hash_mb = max(1, int(value))
+        elif name == 'threads':
+            self.threads = max(1, int(value))
+        else:
+            return
+        # The engine is rebuilt with the new table size and worker count on the next go
+        self.close()
+
+    def set_position(self, tokens):
+        # position [startpos | fen <fen>] [moves <move> ...]
+        moves_index = tokens.index('moves') if 'moves' in tokens else len(tokens)
+        if len(tokens) > 1 and tokens[1] == 'fen':
+            board = chess.Board(' '.join(tokens[2:moves_index]))
+        else:
+            board = chess.Board()
+        for move in tokens[moves_index + 1:]:
+            board.push_uci(move)
+        self.board = board
+
+    def go(self, tokens):
+        params = {}
+        for i, token in enumerate(tokens[:-1]):
+            if token in ('depth', 'movetime', 'wtime', 'btime', 'winc', 'binc', 'movestogo'):
+                params[token] = int(tokens[i + 1])
+        ponder = 'ponder' in tokens
+        infinite = 'infinite' in tokens
+        time_limit = None if infinite else allocate_time(params, self.board.turn)
+        depth = params.get('depth', 64)
+        self.ponder_time = time_limit
+        self.stop_event.clear()
+        self.release.clear()
+        if not (ponder or infinite):
+            self.release.set()
+        mm = self.engine()
+        if ponder:
+            mm.start_ponder()
+        self.search_thread = threading.Thread(target=self.think, daemon=True,
+                                              args=(mm, self.board.copy(), None if ponder else time_limit, depth))
+        self.search_thread.start()
+
+    def think(self, mm, board, time_limit, depth):
+        # bestmove is always sent, even if the search fails, so the GUI is never left waiting
+        turn = board.turn
+        move = None
+        try:
+            move = mm.run_iterative_deepening(board, time_limit, depth, stop=self.stop_event,
+                                              on_iteration=lambda: self.report(turn))
+        finally:
+            # Infinite and ponder searches report bestmove only after stop or ponderhit
+            self.release.wait()
+            pv = mm.pv
+            if move is None:
+                self.send('bestmove 0000')
+            elif len(pv) > 1 and pv[0] == move:
+                self.send('bestmove %s ponder %s' % (move.uci(), pv[1].uci()))
+            else:
+                self.send('bestmove ' + move.uci())
+
+    def report(self, turn):
+        mm = self.mm
+        if mm.best_score is None:
+            return
+        stats = mm.stats()
+        pv = mm.pv
+        self.send('info depth %d score %s nodes %d nps %d time %d pv %s' % (
+            stats['depth'], uci_score(mm.best_score, turn), stats['nodes'] + stats['q_nodes'],
+            stats['nps'], stats['time'] * 1000, ' '.join(move.uci() for move in pv)))
+
+    def ponderhit(self):
+        if self.search_thread is None or not self.search_thread.is_alive():
+            return
+        if self.ponder_time is not None:
+            self.mm.ponderhit(self.ponder_time)
+        self.release.set()
+
+    def stop(self):
+        if self.search_thread is not None:
+            self.stop_event.set()
+            self.release.set()
+            self.search_thread.join()
+            self.search_thread = None
+
+    def close(self):
+        self.stop()
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+def main():
+    # Parallel searches start their worker pool from a search thread while
+    # this thread is blocked reading stdin; forked workers would inherit the
+    # held stdin lock and hang, so workers are always spawned
+    multiprocessing.set_start_method('spawn')
+    engine = UCIEngine()
+    for line in sys.stdin:
+        if not engine.handle(line.strip()):
+            break
+    engine.close()
+
+if __name__ == "__main__":
+    main()